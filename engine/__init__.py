@@ -0,0 +1,11 @@
+"""
+Scheduler engine shared by every entry point.
+
+Sources (sheet, JSON file, HTTP) feed a Scheduler, and the run modes decide
+how often it reads them: once, as a daemon, per serverless invocation, or in
+a background thread for Flask and Streamlit.
+"""
+
+from .core import LATE_GRACE, Scheduler
+from .modes import POLL_INTERVAL, SEND_WINDOW, run_daemon, run_once, run_serverless, start_background, stop_all, stop_on_signals
+from .sources import FileSource, HttpSource, ListSource, SheetSource
@@ -0,0 +1,182 @@
+import os
+import json
+import random
+import sqlite3
+
+from .checkpoint import restore_entry
+from .paths import writable_path
+from .prepare import content_key
+
+# Most sends held in memory at once (waiting for their send time, queued or sending)
+ADMISSION_LIMIT = int(os.environ.get("ADMISSION_LIMIT", "1000"))
+
+# What happens to rows over the limit: "spill" keeps them on disk and admits them in
+# send-time order as sends finish, "reject" drops them, "sample" admits a random
+# subset spread over the whole batch and drops the rest
+OVERFLOW_POLICY = os.environ.get("OVERFLOW_POLICY", "spill")
+
+# Database of the rows waiting for admission under the "spill" policy
+SPILL_DB = os.environ.get("SPILL_DB", "spill.db")
+
+OVERFLOW_POLICIES = ("spill", "reject", "sample")
+
+# Spilled rows written to disk per transaction
+SPILL_CHUNK = 500
+
+
+class Intake:
+    """
+    Admission of one load, row by row. Rows arrive in send-time order; the first free
+    rows are admitted and only they stay in memory. The rest are spilled to disk in
+    chunks or rejected as they come; "sample" keeps a reservoir of free rows instead,
+    so the admitted rows are a uniform sample of the whole load.
+    """
+
+    def __init__(self, free, policy=OVERFLOW_POLICY, spill=None, reject=None, spilled=None):
+        """
+        :param free: Slots available for new sends.
+        :param policy: One of OVERFLOW_POLICIES.
+        :param spill: SpillStore, required for the "spill" policy.
+        :param reject: Function (send_at, entry) called for every rejected row.
+        :param spilled: Function (send_at, entry) called for every spilled row.
+        """
+        self.free = max(0, free)
+        self.policy = policy
+        self.spill = spill if policy == "spill" else None
+        self.reject = reject
+        self.spilled = spilled
+        # New rows queue behind rows already spilled, which are admitted first
+        self.backlog = self.spill is not None and len(self.spill) > 0
+        self.admitted = []
+        self.count = 0
+        self._chunk = []
+
+    @property
+    def overflow(self):
+        """
+        :return: Number of rows offered beyond the free slots.
+        """
+        return max(0, self.count - self.free)
+
+    def add(self, send_at, entry):
+        """
+        Offer one row.
+        :param send_at: Send time as epoch seconds.
+        :param entry: Schedule row dictionary with a row_id.
+        """
+        self.count += 1
+        item = (send_at, entry)
+        if self.backlog or (self.spill is not None and len(self.admitted) >= self.free):
+            self._chunk.append(item)
+            if self.spilled is not None:
+                self.spilled(send_at, entry)
+            if len(self._chunk) >= SPILL_CHUNK:
+                self.flush()
+        elif len(self.admitted) < self.free:
+            self.admitted.append(item)
+        elif self.policy == "sample":
+            # Reservoir sampling: each row seen so far stays with probability free / count
+            index = random.randrange(self.count)
+            if index < self.free:
+                item, self.admitted[index] = self.admitted[index], item
+            self.reject(*item)
+        else:
+            self.reject(*item)
+
+    def flush(self):
+        """
+        Write the spilled rows held back so far.
+        """
+        if self._chunk:
+            self.spill.put(self._chunk)
+            self._chunk = []
+
+    def close(self):
+        """
+        :return: The admitted rows as (send_at, entry) tuples sorted by send time.
+        """
+        if self.spill is not None:
+            self.flush()
+        return sorted(self.admitted, key=lambda item: item[0])
+
+
+class SpillStore:
+    """
+    Rows over the admission limit, kept on disk in send-time order until a slot frees up,
+    so a huge sheet costs disk space rather than memory.
+    """
+
+    def __init__(self, path=SPILL_DB):
+        self.path = writable_path(path)
+        self._conn = None
+        self._count = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS spill (row_id TEXT PRIMARY KEY, send_at REAL, key TEXT, entry TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS spill_send_at ON spill (send_at)")
+            self._count = self._conn.execute("SELECT COUNT(*) FROM spill").fetchone()[0]
+        return self._conn
+
+    def __len__(self):
+        self._connect()
+        return self._count
+
+    def key(self, row):
+        """
+        :param row: row_id() of a row.
+        :return: content_key() of the spilled row, or None if the row is not spilled.
+        """
+        found = self._connect().execute("SELECT key FROM spill WHERE row_id = ?", (row,)).fetchone()
+        return found[0] if found else None
+
+    def put(self, items):
+        """
+        Spill rows, replacing earlier versions of the same rows.
+        :param items: List of (send_at, entry) tuples.
+        """
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO spill VALUES (?, ?, ?, ?)",
+                [(entry["row_id"], send_at, content_key(entry), json.dumps(entry, default=str)) for send_at, entry in items],
+            )
+        self._count = conn.execute("SELECT COUNT(*) FROM spill").fetchone()[0]
+
+    def take(self, limit):
+        """
+        Remove and return the earliest spilled rows.
+        :param limit: Most rows to take.
+        :return: List of (send_at, entry) tuples.
+        """
+        conn = self._connect()
+        rows = conn.execute("SELECT row_id, send_at, entry FROM spill ORDER BY send_at LIMIT ?", (limit,)).fetchall()
+        self.remove([row for row, _, _ in rows])
+        return [(send_at, restore_entry(json.loads(entry))) for _, send_at, entry in rows]
+
+    def remove(self, row_ids):
+        """
+        :param row_ids: Row ids to delete.
+        """
+        conn = self._connect()
+        with conn:
+            conn.executemany("DELETE FROM spill WHERE row_id = ?", [(row,) for row in row_ids])
+        self._count = conn.execute("SELECT COUNT(*) FROM spill").fetchone()[0]
+
+    def discard_missing(self, seen, start, end):
+        """
+        Delete spilled rows in [start, end) that the source no longer holds.
+        :param seen: Set of the row ids the source holds in the range.
+        :param start: Range start as epoch seconds.
+        :param end: Range end as epoch seconds.
+        :return: List of the deleted entries.
+        """
+        conn = self._connect()
+        rows = conn.execute("SELECT row_id, entry FROM spill WHERE send_at >= ? AND send_at < ?", (start, end)).fetchall()
+        missing = [(row, entry) for row, entry in rows if row not in seen]
+        self.remove([row for row, _ in missing])
+        return [restore_entry(json.loads(entry)) for _, entry in missing]
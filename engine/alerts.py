@@ -0,0 +1,59 @@
+import os
+import time
+import threading
+
+# URL that receives alerts as JSON POSTs (e.g. a Slack or Discord incoming webhook); empty to only print them
+ALERT_WEBHOOK = os.environ.get("ALERT_WEBHOOK", "")
+
+# Seconds between two alerts of the same kind
+ALERT_INTERVAL = float(os.environ.get("ALERT_INTERVAL_SECONDS", "300"))
+
+# Functions called as handler(event, message, details) for every alert
+handlers = []
+
+# event -> time of its last alert
+_last_sent = {}
+
+
+def subscribe(handler):
+    """
+    Register a function that receives every alert, e.g. to page someone.
+    :param handler: Function (event, message, details dictionary); it must not block.
+    """
+    handlers.append(handler)
+
+
+def _post(payload):
+    import requests
+
+    try:
+        requests.post(ALERT_WEBHOOK, json=payload, timeout=10).raise_for_status()
+    except Exception as e:
+        print(f"Failed to send alert: {e}")
+
+
+def alert(event, message, **details):
+    """
+    Report a condition an operator should look at. Repeats of the same event within
+    ALERT_INTERVAL seconds are dropped so an overload does not flood the channel.
+    :param event: Kind of alert, e.g. "admission_overflow".
+    :param message: Human-readable description.
+    :param details: Extra values passed to handlers and the webhook.
+    :return: True if the alert went out.
+    """
+    now = time.monotonic()
+    if event in _last_sent and now - _last_sent[event] < ALERT_INTERVAL:
+        return False
+    _last_sent[event] = now
+
+    print(f"ALERT {event}: {message}")
+    for handler in handlers:
+        try:
+            handler(event, message, details)
+        except Exception as e:
+            print(f"Alert handler failed: {e}")
+    if ALERT_WEBHOOK:
+        # "text" makes chat webhooks show the message as is
+        payload = {"event": event, "text": message, **details}
+        threading.Thread(target=_post, args=(payload,), name="alert", daemon=True).start()
+    return True
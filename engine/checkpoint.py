@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import base64
+
+from .paths import writable_path
+
+# Sends left over at shutdown, picked up by the next start
+CHECKPOINT_FILE = os.environ.get("CHECKPOINT_FILE", "checkpoint.json")
+
+# Seconds a checkpointed upload is trusted; Telegram drops uploaded files that were never sent
+CHECKPOINT_PREPARED_TTL = int(os.environ.get("CHECKPOINT_PREPARED_TTL_SECONDS", "3600"))
+
+
+def pack(value):
+    """
+    Make a prepared send JSON-serializable; Telethon objects (resolved peers,
+    uploaded files, formatting entities) are kept as their TL bytes.
+    :param value: Value from a prepare.prepare_entry result.
+    :return: JSON-serializable value.
+    """
+    from telethon.tl.tlobject import TLObject
+
+    if isinstance(value, TLObject):
+        return {"tl": base64.b64encode(bytes(value)).decode()}
+    if isinstance(value, bytes):
+        return {"bytes": base64.b64encode(value).decode()}
+    if isinstance(value, dict):
+        return {"dict": {key: pack(item) for key, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return [pack(item) for item in value]
+    return value
+
+
+def unpack(value):
+    """
+    Reverse of pack.
+    :param value: Value read from a checkpoint.
+    :return: The original value.
+    """
+    from telethon.extensions import BinaryReader
+
+    if isinstance(value, dict):
+        if "tl" in value:
+            with BinaryReader(base64.b64decode(value["tl"])) as reader:
+                return reader.tgread_object()
+        if "bytes" in value:
+            return base64.b64decode(value["bytes"])
+        return {key: unpack(item) for key, item in value["dict"].items()}
+    if isinstance(value, list):
+        return [unpack(item) for item in value]
+    return value
+
+
+def restore_entry(entry):
+    """
+    Turn a schedule entry read from JSON back into the shape ScheduleRow.to_entry() returns,
+    so content_key() matches the rows of the next load.
+    :param entry: Dictionary read from a checkpoint.
+    :return: Schedule row dictionary.
+    """
+    if isinstance(entry.get("media"), list):
+        entry["media"] = tuple(entry["media"])
+    entry["vars"] = tuple(tuple(pair) for pair in entry.get("vars") or ())
+    return entry
+
+
+def save_checkpoint(queued, done, path=CHECKPOINT_FILE):
+    """
+    Write the sends left over at shutdown.
+    :param queued: List of (send_at, entry, prepared or None) still to be sent.
+    :param done: List of (send_at, entry) finished recently, which a reload must not send again.
+    :param path: Checkpoint file.
+    :return: True if the file was written.
+    """
+    path = writable_path(path)
+    checkpoint = {
+        "saved_at": time.time(),
+        "queued": [
+            {"send_at": send_at, "entry": entry, "prepared": pack(prepared) if prepared is not None else None}
+            for send_at, entry, prepared in queued
+        ],
+        "done": [{"send_at": send_at, "entry": entry} for send_at, entry in done],
+    }
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(checkpoint, file, default=str)
+        os.replace(temp_path, path)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Failed to write checkpoint: {e}")
+        return False
+
+
+def load_checkpoint(path=CHECKPOINT_FILE):
+    """
+    Read and remove the checkpoint of the previous run.
+    Prepared sends older than CHECKPOINT_PREPARED_TTL are dropped and redone at send time.
+    :param path: Checkpoint file.
+    :return: Tuple (queued, done) as passed to save_checkpoint; both empty without a checkpoint.
+    """
+    path = writable_path(path)
+    try:
+        with open(path, encoding="utf-8") as file:
+            checkpoint = json.load(file)
+    except FileNotFoundError:
+        return [], []
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable checkpoint: {e}")
+        checkpoint = {}
+
+    fresh = time.time() - checkpoint.get("saved_at", 0) < CHECKPOINT_PREPARED_TTL
+    queued = []
+    for item in checkpoint.get("queued", ()):
+        prepared = None
+        if fresh and item.get("prepared") is not None:
+            try:
+                prepared = unpack(item["prepared"])
+            except Exception as e:
+                print(f"Redoing checkpointed send for {item['entry'].get('group_id')}: {e}")
+        queued.append((item["send_at"], restore_entry(item["entry"]), prepared))
+    done = [(item["send_at"], restore_entry(item["entry"])) for item in checkpoint.get("done", ())]
+
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return queued, done
@@ -0,0 +1,70 @@
+import os
+import asyncio
+
+# Number of accounts connected at the same time during warm-up
+WARMUP_CONCURRENCY = int(os.environ.get("WARMUP_CONCURRENCY", "8"))
+
+# Seconds allowed for one account to connect and confirm its authorization
+WARMUP_TIMEOUT = float(os.environ.get("WARMUP_TIMEOUT", "20"))
+
+# Phones whose client failed to warm up, with the reason
+unhealthy = {}
+
+
+async def connect_client(phone, client, semaphore, timeout=WARMUP_TIMEOUT):
+    """
+    Connect a client and check that its session is authorized.
+    :param phone: Account phone number.
+    :param client: TelegramClient instance.
+    :param semaphore: Semaphore bounding concurrent connects.
+    :param timeout: Seconds allowed for connect and authorization check.
+    :return: True if the account is ready to send.
+    """
+    async with semaphore:
+        try:
+            if not client.is_connected():
+                await asyncio.wait_for(client.connect(), timeout)
+            if not await asyncio.wait_for(client.is_user_authorized(), timeout):
+                raise Exception("session is not authorized")
+            unhealthy.pop(phone, None)
+            return True
+        except asyncio.TimeoutError:
+            unhealthy[phone] = f"no connection within {timeout:g}s"
+        except Exception as e:
+            unhealthy[phone] = str(e) or type(e).__name__
+
+    print(f"Account {phone} is unhealthy: {unhealthy[phone]}")
+    try:
+        await client.disconnect()
+    except Exception:
+        pass
+    return False
+
+
+async def warm_up_clients(clients, concurrency=WARMUP_CONCURRENCY, timeout=WARMUP_TIMEOUT):
+    """
+    Connect and authorize all clients concurrently with a bounded pool.
+    :param clients: Dictionary with phone numbers as keys and Telegram clients as values.
+    :param concurrency: Maximum number of simultaneous connects.
+    :param timeout: Seconds allowed per account.
+    :return: Dictionary with only the healthy clients.
+    """
+    if not clients:
+        return {}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    phones = list(clients)
+    results = await asyncio.gather(*(connect_client(phone, clients[phone], semaphore, timeout) for phone in phones))
+
+    ready = {phone: clients[phone] for phone, ok in zip(phones, results) if ok}
+    print(f"Warm-up finished: {len(ready)}/{len(phones)} account(s) ready.")
+    return ready
+
+
+def is_healthy(phone):
+    """
+    Whether the account passed its last warm-up.
+    :param phone: Account phone number.
+    :return: False if the account was marked unhealthy.
+    """
+    return phone not in unhealthy
@@ -0,0 +1,645 @@
+import os
+import time
+import weakref
+import asyncio
+import threading
+
+from . import nativeSchedule
+from .admission import ADMISSION_LIMIT, OVERFLOW_POLICY, Intake, SpillStore
+from .alerts import alert
+from .checkpoint import CHECKPOINT_FILE, load_checkpoint, save_checkpoint
+from .clientPool import is_healthy, unhealthy, warm_up_clients
+from .deadLetters import DeadLetterStore
+from .prepare import content_key, prepare_entries, row_id, send_prepared
+from .rateControl import RateController, RetryLater, chat_key
+from .retry import PERMANENT, RETRY_ATTEMPTS, backoff_delay, classify
+from .scheduleTable import ScheduleTable, rows_in_horizon
+from .sendQueue import SendQueue
+from .templates import render_entry
+from .sessionStore import flush_sessions, session_for
+from .statusStore import StatusStore
+from .sources import SheetSource, as_source
+from .tracing import span
+
+# Rows whose send time passed less than this many seconds ago are still sent
+LATE_GRACE = int(os.environ.get("LATE_GRACE_SECONDS", "60"))
+
+# How many times a send is repeated after Telegram asked to wait
+FLOOD_RETRIES = int(os.environ.get("FLOOD_RETRIES", "3"))
+
+# How long account credentials are reused before the account source is read again
+CONFIG_TTL = int(os.environ.get("CONFIG_TTL_SECONDS", "300"))
+
+# Seconds a shutdown waits for sends that are due or already on the wire
+SHUTDOWN_GRACE = int(os.environ.get("SHUTDOWN_GRACE_SECONDS", "8"))
+
+
+class Scheduler:
+    """
+    The hot path shared by every entry point: load the rows of a time window,
+    connect only the accounts they need, prepare each send ahead of time and
+    fire it at its scheduled instant.
+    """
+
+    # Schedulers with a run in progress, stopped together on shutdown signals
+    running = weakref.WeakSet()
+
+    def __init__(self, source=None, accounts=None, interactive=False, client_factory=None):
+        """
+        :param source: Schedule source (default is the ScheduleMessage sheet), or a list of rows.
+        :param accounts: Account source with api_id, api_hash and phone columns
+                         (default is the TelegramConfig sheet), or a list of rows.
+        :param interactive: Prompt for a login code when a session is not authorized.
+        :param client_factory: Optional function (phone, api_id, api_hash) -> client, e.g. for simulations
+                               (default is a TelegramClient on the shared session store).
+        """
+        self.source = as_source(source) if source is not None else SheetSource("ScheduleMessage")
+        self.accounts = as_source(accounts) if accounts is not None else SheetSource("TelegramConfig")
+        self.interactive = interactive
+        self.client_factory = client_factory or self.telegram_client
+        self.clients = {}
+        self.credentials = {}
+        self.default_phone = None
+        # row_id -> (send time, content_key, task, entry) of every row queued or sent, so reloads
+        # never send twice and edits or deletions reach the pending send in O(1)
+        self.pending = {}
+        # row_ids whose send RPC has started and can no longer be cancelled
+        self.sending = set()
+        # Status feed read by the dashboard
+        self.status = StatusStore()
+        # Sends that failed for good, kept for replay
+        self.dead_letters = DeadLetterStore()
+        # phone -> SendQueue ordering the due sends of that account
+        self.queues = {}
+        # Learned send rates per account and chat
+        self.rates = RateController()
+        # Sends handed to Telegram's scheduled messages, when enabled
+        self.native = nativeSchedule.ScheduledStore() if nativeSchedule.NATIVE_SCHEDULE_SECONDS > 0 else None
+        # row_id -> prepared send of every pending row, checkpointed on shutdown
+        self.staged = {}
+        # Where shutdown leaves the unsent rows for the next start (None to keep nothing)
+        self.checkpoint = CHECKPOINT_FILE
+        # Admission control: at most limit sends in memory, the rest handled by the overflow policy
+        self.limit = ADMISSION_LIMIT
+        self.overflow = OVERFLOW_POLICY
+        self.spill = SpillStore() if OVERFLOW_POLICY == "spill" else None
+        self.live = 0
+        # Slots claimed by batches being launched, so concurrent launches stay under the limit
+        self.reserved = 0
+        self._freed = None
+        # Prepare batches in progress, which a shutdown lets finish
+        self.preparing = set()
+        # Set by stop(); no new rows are taken afterwards
+        self.stopping = False
+        # Set while no run is in progress
+        self.finished = threading.Event()
+        self.finished.set()
+        self.loop = None
+        self._stop_event = None
+        # End of the last serverless window, where the next one starts
+        self.window_end = None
+        self._resumed = False
+        self._shut_down = False
+        self._credentials_loaded_at = None
+
+    def load_credentials(self):
+        """
+        Read the account source, reusing the result for CONFIG_TTL seconds.
+        Rows without a phone are sent from the first valid account.
+        :return: Dictionary with phone numbers as keys and (api_id, api_hash) as values.
+        """
+        if self._credentials_loaded_at is not None and time.monotonic() - self._credentials_loaded_at < CONFIG_TTL:
+            return self.credentials
+
+        try:
+            rows = list(self.accounts.rows())
+        except Exception as e:
+            print(f"Error loading account configuration: {e}")
+            return self.credentials
+
+        for config in rows:
+            api_id = config.get("api_id")
+            api_hash = config.get("api_hash")
+            phone = config.get("phone")
+
+            if api_id and api_hash and phone:
+                self.credentials[phone] = (api_id, api_hash)
+                self.default_phone = self.default_phone or phone
+            else:
+                print(f"Invalid configuration: {config}")
+
+        self._credentials_loaded_at = time.monotonic()
+        return self.credentials
+
+    def load(self, start, end):
+        """
+        Read the schedule source once, keeping the rows with start <= send time < end.
+        Rows that carry their own api_id and api_hash register that account.
+        :param start: Window start as epoch seconds.
+        :param end: Window end as epoch seconds.
+        :return: Sorted ScheduleTable.
+        :raises: Exception if the source cannot be read.
+        """
+        def with_credentials(rows):
+            for send_at, entry in rows:
+                phone, api_id, api_hash = entry.get("phone"), entry.get("api_id"), entry.get("api_hash")
+                if phone and api_id and api_hash:
+                    self.credentials.setdefault(phone, (api_id, api_hash))
+                yield send_at, entry
+
+        with span("load", start=start, end=end):
+            table = ScheduleTable()
+            table.extend(with_credentials(rows_in_horizon(self.source.rows(), start, end)))
+            table.sort()
+        return table
+
+    @staticmethod
+    def telegram_client(phone, api_id, api_hash):
+        """
+        :return: TelegramClient of one account on the shared session store.
+        """
+        from telethon import TelegramClient
+
+        # Flood waits are raised instead of slept so the rate controller learns from them
+        return TelegramClient(session_for(phone), api_id, api_hash, flood_sleep_threshold=0)
+
+    async def connect(self, phones):
+        """
+        Construct and warm up the clients of the given accounts.
+        :param phones: Set of phone numbers with sends due.
+        :return: Dictionary with only the healthy clients.
+        """
+        credentials = self.load_credentials()
+        for phone in phones:
+            if phone in self.clients or phone not in credentials:
+                continue
+            api_id, api_hash = credentials[phone]
+            try:
+                self.clients[phone] = self.client_factory(phone, api_id, api_hash)
+                print(f"Initialized client for {phone}.")
+            except Exception as e:
+                print(f"Failed to initialize client for {phone}: {e}")
+
+        cold = {phone: self.clients[phone] for phone in phones if phone in self.clients and not self.clients[phone].is_connected()}
+        if cold:
+            with span("connect", accounts=len(cold)):
+                await warm_up_clients(cold)
+
+        if self.interactive:
+            for phone in cold:
+                if unhealthy.get(phone) == "session is not authorized":
+                    try:
+                        await self.clients[phone].start(phone=phone)
+                        unhealthy.pop(phone, None)
+                    except Exception as e:
+                        print(f"Failed to log in {phone}: {e}")
+
+        return {phone: self.clients[phone] for phone in phones if phone in self.clients and is_healthy(phone)}
+
+    def cancel(self, row):
+        """
+        Cancel the pending send of a row, unless it is already being sent or done.
+        :param row: row_id() of the row.
+        :return: True if the send was cancelled.
+        """
+        pending = self.pending.get(row)
+        if pending is None or pending[2].done() or row in self.sending:
+            return False
+        pending[2].cancel()
+        del self.pending[row]
+        self.status.record(pending[3], "cancelled")
+        return True
+
+    async def dispatch(self, rows, start=None, end=None):
+        """
+        Send a batch of rows, each at its own send time.
+        Rows already pending are matched by row_id(): unchanged ones are left alone and
+        edited ones replace their pending send. When start and end are given, rows must be
+        everything the source holds in [start, end), and pending sends in that range that
+        are no longer in it are cancelled.
+        :param rows: Iterable of ScheduleRow.
+        :param start: Start of the reloaded range as epoch seconds.
+        :param end: End of the reloaded range as epoch seconds.
+        :return: Number of messages sent.
+        """
+        if self.stopping:
+            return 0
+        now = time.time()
+        for row in [row for row, (send_at, _, task, _) in self.pending.items() if send_at < now - LATE_GRACE and task.done()]:
+            del self.pending[row]
+
+        self.load_credentials()
+        seen = set()
+        intake = Intake(self.limit - self.live - self.reserved, self.overflow, self.spill, self.reject,
+                        lambda send_at, entry: self.status.record(entry, "pending"))
+        for schedule_row in rows:
+            entry = schedule_row.to_entry()
+            entry["phone"] = entry["phone"] or self.default_phone
+            entry["row_id"] = row = row_id(entry)
+            seen.add(row)
+            pending = self.pending.get(row)
+            if pending is not None:
+                if pending[1] == content_key(entry) or not self.cancel(row):
+                    continue
+                print(f"Rescheduling edited schedule entry {row}")
+            elif self.spill is not None and len(self.spill):
+                spilled = self.spill.key(row)
+                if spilled == content_key(entry):
+                    continue  # Waiting for admission
+                if spilled is not None:
+                    self.spill.remove([row])
+            if self.native is not None and nativeSchedule.slot_key(entry) in self.native:
+                continue  # Telegram sends it
+            if not entry["phone"]:
+                print(f"Skipping unassigned schedule entry: {entry}")
+                continue
+            intake.add(schedule_row.send_at, entry)
+
+        if start is not None:
+            for row, (send_at, *_) in list(self.pending.items()):
+                if row not in seen and start <= send_at < end and self.cancel(row):
+                    print(f"Cancelled send of removed schedule entry {row}")
+            if self.spill is not None and len(self.spill):
+                for entry in self.spill.discard_missing(seen, start, end):
+                    self.status.record(entry, "cancelled")
+
+        batch = intake.close()
+        if intake.overflow:
+            fate = f"spilled to disk; {len(self.spill)} rows are waiting" if self.spill is not None \
+                else f"dropped ({self.overflow} policy) and kept as dead letters"
+            alert("admission_overflow", f"{intake.overflow} rows over the limit of {self.limit} sends in memory were {fate}",
+                  policy=self.overflow, count=intake.overflow)
+
+        tasks = await self.launch(batch)
+        # Spilled rows are admitted, earliest first, as sends finish
+        while self.spill is not None and len(self.spill) and not self.stopping:
+            free = await self.capacity()
+            if self.stopping:
+                break
+            tasks += await self.launch(self.unspill(free))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return sum(1 for result in results if result is True)
+
+    def reject(self, send_at, entry):
+        """
+        Turn away a row over the admission limit: it is recorded as dropped and kept as a
+        dead letter, and remembered as finished so reloads do not offer it again.
+        :param send_at: Send time as epoch seconds.
+        :param entry: Schedule row dictionary with a row_id.
+        """
+        done = asyncio.get_running_loop().create_future()
+        done.set_result(None)
+        self.pending[entry["row_id"]] = (send_at, content_key(entry), done, entry)
+        self.status.record(entry, "dropped")
+        self.dead_letters.add(entry, f"admission limit of {self.limit} sends reached ({self.overflow} policy)", 0)
+
+    def unspill(self, limit):
+        """
+        Take the earliest spilled rows for admission. Rows past both LATE_GRACE and their
+        deadline, e.g. left in the spill store by an earlier run, are dropped to the
+        dead letters instead of being sent.
+        :param limit: Most rows to take.
+        :return: List of (send_at, entry) tuples.
+        """
+        now = time.time()
+        batch = []
+        for send_at, entry in self.spill.take(limit):
+            if now > max(send_at + LATE_GRACE, entry.get("deadline") or 0):
+                print(f"Dropping spilled entry for {entry['group_id']}: its send time passed")
+                self.status.record(entry, "dropped")
+                self.dead_letters.add(entry, "send time passed while waiting for admission", 0)
+            else:
+                batch.append((send_at, entry))
+        return batch
+
+    async def capacity(self):
+        """
+        Wait until fewer than limit sends are in memory.
+        :return: Number of free slots.
+        """
+        while self.live + self.reserved >= self.limit:
+            if self._freed is None:
+                self._freed = asyncio.Event()
+            self._freed.clear()
+            await self._freed.wait()
+        return self.limit - self.live - self.reserved
+
+    async def launch(self, batch):
+        """
+        Connect, prepare and start the sends of admitted rows.
+        :param batch: List of (send_at, entry) tuples.
+        :return: List of the started send tasks.
+        """
+        if not batch:
+            return []
+        # Claimed before the first await; start_send moves each row from reserved to live
+        self.reserved += len(batch)
+        try:
+            return await self._launch(batch)
+        finally:
+            self.reserved -= len(batch)
+
+    async def _launch(self, batch):
+        clients = await self.connect({entry["phone"] for _, entry in batch})
+        if self.stopping:
+            # Keep the rows for the next start
+            if self.spill is not None:
+                self.spill.put(batch)
+            return []
+        ready = []
+        for send_at, entry in batch:
+            if entry["phone"] in clients:
+                ready.append((send_at, entry))
+            # Rows of unusable accounts are not recorded, so the next load within LATE_GRACE retries them
+            elif entry["phone"] in unhealthy:
+                print(f"Skipping entry for unhealthy account {entry['phone']}: {unhealthy[entry['phone']]}")
+            else:
+                print(f"Skipping entry for unconfigured account {entry['phone']}: {entry}")
+
+        # Everything but the send RPC happens before the first send time
+        staging = asyncio.ensure_future(prepare_entries(clients, [entry for _, entry in ready]))
+        self.preparing.add(staging)
+        try:
+            prepared, rejected = await staging
+        finally:
+            self.preparing.discard(staging)
+
+        tasks = []
+        for send_at, entry in ready:
+            row = entry["row_id"]
+            if row in self.pending:
+                continue
+            if row in rejected:
+                self.status.record(entry, "failed")
+                self.dead_letters.add(entry, rejected[row])
+                continue
+            tasks.append(self.start_send(clients[entry["phone"]], send_at, entry, prepared.get(row)))
+        return tasks
+
+    def start_send(self, client, send_at, entry, prepared=None):
+        """
+        Start the task sending one row at its send time and register it as pending.
+        :param client: Connected TelegramClient instance.
+        :param send_at: Send time as epoch seconds.
+        :param entry: Schedule row dictionary with a row_id.
+        :param prepared: Optional send staged by prepare.prepare_entries.
+        :return: The send task.
+        """
+        row = entry["row_id"]
+        task = asyncio.create_task(self.send_at(client, send_at, entry, prepared))
+        self.pending[row] = (send_at, content_key(entry), task, entry)
+        if prepared is not None:
+            self.staged[row] = prepared
+        self.live += 1
+        task.add_done_callback(lambda _: self._finished_send(row))
+        self.status.record(entry, "pending")
+        return task
+
+    def _finished_send(self, row):
+        self.staged.pop(row, None)
+        self.live -= 1
+        if self._freed is not None:
+            self._freed.set()
+
+    async def hand_off(self, rows):
+        """
+        Hand far-future rows to Telegram's scheduled messages and sync the ones
+        handed off earlier with the schedule (see nativeSchedule.hand_off).
+        :param rows: Every ScheduleRow from now on.
+        :return: Number of scheduled messages created, edited or deleted.
+        """
+        if self.native is None or self.stopping:
+            return 0
+        self.load_credentials()
+        return await nativeSchedule.hand_off(self, rows)
+
+    async def send_at(self, client, send_at, entry, prepared=None):
+        """
+        Wait until the send time, then queue the message behind the more urgent
+        sends of the same account.
+        :param client: Connected TelegramClient instance.
+        :param send_at: Send time as epoch seconds.
+        :param entry: Schedule row dictionary.
+        :param prepared: Optional send staged by prepare.prepare_entries.
+        :return: True if the message was sent.
+        """
+        delay = send_at - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        phone = entry["phone"]
+        queue = self.queues.get(phone)
+        if queue is None:
+            queue = self.queues[phone] = SendQueue(self.send_now, pace=lambda: self.rates.wait(phone))
+
+        # Retries wait in this task, outside the queue, so other sends keep going
+        floods = failures = 0
+        while True:
+            try:
+                with span("queue", group_id=entry["group_id"], priority=entry["priority"]):
+                    result = await queue.submit(entry["priority"], entry["deadline"], client, entry, prepared)
+                if result is None:
+                    self.status.record(entry, "dropped")
+                return result
+            except RetryLater as e:
+                floods += 1
+                if floods > FLOOD_RETRIES:
+                    return self.give_up(entry, e, floods + failures)
+                await asyncio.sleep(e.seconds)
+            except Exception as e:
+                failures += 1
+                if classify(e) == PERMANENT or failures > RETRY_ATTEMPTS:
+                    return self.give_up(entry, e, floods + failures)
+                delay = backoff_delay(failures - 1)
+                print(f"Retrying message to {entry['group_id']} in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                # A failure may have come from the staged send; redo the work inline
+                prepared = None
+                self.staged.pop(entry.get("row_id"), None)
+
+    def give_up(self, entry, error, attempts):
+        """
+        Record a send that failed for good in the status feed and the dead-letter store.
+        :param entry: Schedule row dictionary.
+        :param error: Last exception.
+        :param attempts: Number of attempts made.
+        :return: False.
+        """
+        print(f"Failed to send message to {entry['group_id']}: {error}")
+        self.status.record(entry, "failed")
+        self.dead_letters.add(entry, f"{type(error).__name__}: {error}", attempts)
+        return False
+
+    async def send_now(self, client, entry, prepared=None):
+        """
+        Send one message immediately.
+        :param client: Connected TelegramClient instance.
+        :param entry: Schedule row dictionary.
+        :param prepared: Optional send staged by prepare.prepare_entries.
+        :return: True if the message was sent.
+        :raises: RetryLater if Telegram asked to wait before sending again;
+                 any other exception of the send (see retry.classify).
+        """
+        from telethon import errors
+
+        group_id = entry["group_id"]
+        key = chat_key(entry["phone"], group_id)
+        self.sending.add(entry.get("row_id"))
+        try:
+            with span("rate_wait", group_id=group_id):
+                await self.rates.wait(key, create=False)
+            with span("send_rpc", group_id=group_id, phone=entry["phone"], prepared=prepared is not None):
+                if prepared is not None:
+                    await send_prepared(client, prepared)
+                else:
+                    entity = await client.get_input_entity(group_id)
+                    text = await render_entry(client, entry)
+                    if entry.get("media"):
+                        await client.send_file(entity, entry["media"], caption=text)
+                    else:
+                        await client.send_message(entity, text)
+            self.rates.success(entry["phone"], key)
+            self.status.record(entry, "sent")
+            print(f"Message sent to {group_id}: {entry['message']}")
+            return True
+        except errors.FloodWaitError as e:
+            self.rates.backoff(entry["phone"], e.seconds)
+            raise RetryLater(e.seconds, "flood wait")
+        except errors.SlowModeWaitError as e:
+            self.rates.backoff(key, e.seconds)
+            raise RetryLater(e.seconds, "slow mode")
+        finally:
+            self.sending.discard(entry.get("row_id"))
+
+    def stop(self):
+        """
+        Ask the running mode to shut down (see shutdown). Safe to call from any thread
+        and from signal handlers.
+        """
+        self.stopping = True
+        event, loop = self._stop_event, self.loop
+        if event is not None and loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(event.set)
+
+    async def until_stopped(self):
+        """
+        Wait until stop() is called.
+        """
+        if self._stop_event is None:
+            self._stop_event = asyncio.Event()
+        if not self.stopping:
+            await self._stop_event.wait()
+
+    async def resume(self):
+        """
+        Begin a run: restart the sends checkpointed by the previous shutdown. Their rows,
+        resolved chats and uploads come from the checkpoint, so nothing is fetched or
+        resolved again. Rows finished within LATE_GRACE, by the previous run or any
+        earlier process writing the same status feed, are not sent twice.
+        :return: List of the restarted send tasks.
+        """
+        if self._shut_down:
+            # A warm process that survived an earlier shutdown starts afresh
+            self.stopping = self._shut_down = False
+            self._stop_event = None
+        self.loop = asyncio.get_running_loop()
+        self.finished.clear()
+        Scheduler.running.add(self)
+
+        if not self._resumed:
+            self._resumed = True
+            # Rows a previous process already finished (per the status feed) are not sent again
+            for row, send_at in self.status.finished_since(time.time() - LATE_GRACE):
+                finished = self.loop.create_future()
+                finished.set_result(None)
+                self.pending.setdefault(row, (send_at, None, finished, {"row_id": row, "send_time": None}))
+
+        queued, done = load_checkpoint(self.checkpoint) if self.checkpoint else ([], [])
+        for send_at, entry in done:
+            finished = self.loop.create_future()
+            finished.set_result(None)
+            self.pending.setdefault(entry["row_id"], (send_at, content_key(entry), finished, entry))
+        if not queued:
+            return []
+
+        now = time.time()
+        resumable = []
+        for send_at, entry, prepared in queued:
+            if send_at < now - LATE_GRACE:
+                print(f"Dropping checkpointed entry for {entry['group_id']}: its send time passed")
+                self.status.record(entry, "dropped")
+            elif entry["row_id"] not in self.pending:
+                resumable.append((send_at, entry, prepared))
+
+        clients = await self.connect({entry["phone"] for _, entry, _ in resumable})
+        tasks = []
+        for send_at, entry, prepared in resumable:
+            # Rows of unusable accounts are left to the next load, like in dispatch
+            if entry["phone"] in clients:
+                tasks.append(self.start_send(clients[entry["phone"]], send_at, entry, prepared))
+        print(f"Resumed {len(tasks)} checkpointed sends.")
+        return tasks
+
+    async def shutdown(self, grace=SHUTDOWN_GRACE):
+        """
+        Stop gracefully: take no new rows, give batches being prepared and sends due
+        within the grace period time to finish, checkpoint every other pending send
+        with its prepared state for resume(), then close.
+        A send cut off during its RPC may or may not have arrived; it is recorded as
+        failed and kept as a dead letter instead of being sent again.
+        :param grace: Seconds to wait for in-flight work.
+        :return: Number of sends checkpointed.
+        """
+        self.stop()
+        deadline = time.time() + grace
+        if self.preparing:
+            await asyncio.wait(set(self.preparing), timeout=grace)
+            # Let dispatch register the sends it just prepared
+            await asyncio.sleep(0)
+
+        due = [task for send_at, _, task, _ in self.pending.values() if not task.done() and send_at <= deadline]
+        due += [self.pending[row][2] for row in self.sending if row in self.pending]
+        if due:
+            await asyncio.wait(set(due), timeout=max(0.0, deadline - time.time()))
+
+        queued, done, cancelled = [], [], []
+        for row, (send_at, _, task, entry) in list(self.pending.items()):
+            if task.done():
+                if send_at >= time.time() - LATE_GRACE:
+                    done.append((send_at, entry))
+                continue
+            if row in self.sending:
+                self.give_up(entry, RuntimeError("interrupted by shutdown during the send; delivery unknown"), 1)
+                done.append((send_at, entry))
+            else:
+                queued.append((send_at, entry, self.staged.get(row)))
+            task.cancel()
+            cancelled.append(task)
+        await asyncio.gather(*cancelled, return_exceptions=True)
+
+        if self.checkpoint and (queued or done):
+            save_checkpoint(queued, done, self.checkpoint)
+        print(f"Shut down with {len(queued)} sends checkpointed.")
+        await self.close()
+        self._shut_down = True
+        return len(queued)
+
+    async def close(self):
+        """
+        Stop the send queues, disconnect every client and write pending session changes.
+        """
+        for queue in self.queues.values():
+            queue.close()
+        self.queues.clear()
+        for client in self.clients.values():
+            try:
+                await client.disconnect()
+            except Exception as e:
+                print(f"Failed to disconnect client: {e}")
+        self.clients.clear()
+        self.rates.save(force=True)
+        self.status.flush()
+        flush_sessions()
+        Scheduler.running.discard(self)
+        self.finished.set()
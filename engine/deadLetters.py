@@ -0,0 +1,126 @@
+import os
+import json
+import math
+import time
+import sqlite3
+from datetime import datetime
+
+from .paths import writable_path
+from .scheduleTable import ScheduleTable
+
+# Database of the sends that failed for good
+DEAD_LETTER_DB = os.environ.get("DEAD_LETTER_DB", "dead_letters.db")
+
+
+def to_sheet_row(entry):
+    """
+    Turn a schedule entry back into a sheet-style row that can be scheduled again.
+    :param entry: Schedule row dictionary as passed to the send functions.
+    :return: JSON-serializable dictionary.
+    """
+    row = dict(entry.get("vars") or ())
+    media = entry.get("media")
+    row.update(
+        id=entry.get("id"),
+        phone=entry.get("phone"),
+        group_id=entry.get("group_id"),
+        send_time=entry.get("send_time"),
+        message=entry.get("message"),
+        media=list(media) if isinstance(media, tuple) else media,
+        priority=entry.get("priority"),
+    )
+    return row
+
+
+class DeadLetterStore:
+    """
+    Sends that failed permanently or ran out of retries, with the reason, kept until replayed.
+    """
+
+    def __init__(self, path=DEAD_LETTER_DB):
+        self.path = writable_path(path)
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letters ("
+                "row_id TEXT PRIMARY KEY, row TEXT, reason TEXT, attempts INTEGER, failed_at REAL)"
+            )
+        return self._conn
+
+    def add(self, entry, reason, attempts=1):
+        """
+        Store a failed send, replacing an earlier failure of the same row.
+        :param entry: Schedule row dictionary with a row_id.
+        :param reason: Why the send failed.
+        :param attempts: Number of attempts made.
+        """
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO dead_letters VALUES (?, ?, ?, ?, ?)",
+                    (entry["row_id"], json.dumps(to_sheet_row(entry)), str(reason), attempts, time.time()),
+                )
+        except sqlite3.Error as e:
+            print(f"Failed to store dead letter for {entry.get('group_id')}: {e}")
+
+    def select(self, row_ids=None, reason=None):
+        """
+        Read dead letters.
+        :param row_ids: Optional row ids to limit the result to.
+        :param reason: Optional text the failure reason must contain.
+        :return: List of dictionaries with row_id, row, reason, attempts and failed_at.
+        """
+        query = "SELECT row_id, row, reason, attempts, failed_at FROM dead_letters"
+        conditions, params = [], []
+        if row_ids:
+            conditions.append(f"row_id IN ({', '.join('?' * len(row_ids))})")
+            params.extend(row_ids)
+        if reason:
+            conditions.append("reason LIKE ?")
+            params.append(f"%{reason}%")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return [
+            {"row_id": row_id, "row": json.loads(row), "reason": reason, "attempts": attempts, "failed_at": failed_at}
+            for row_id, row, reason, attempts, failed_at in self._connect().execute(query + " ORDER BY failed_at", params)
+        ]
+
+    def remove(self, row_ids):
+        """
+        Delete dead letters.
+        :param row_ids: Row ids to delete.
+        """
+        conn = self._connect()
+        with conn:
+            conn.executemany("DELETE FROM dead_letters WHERE row_id = ?", [(row_id,) for row_id in row_ids])
+
+
+async def replay(scheduler, row_ids=None, reason=None):
+    """
+    Send dead letters again, all at once: they are removed from the store and
+    dispatched as rows due now; failures land in the store again.
+    :param scheduler: Scheduler instance.
+    :param row_ids: Optional row ids to replay (default is every dead letter).
+    :param reason: Optional text the failure reason must contain.
+    :return: Number of messages sent.
+    """
+    letters = scheduler.dead_letters.select(row_ids, reason)
+    if not letters:
+        return 0
+
+    send_time = datetime.fromtimestamp(math.ceil(time.time())).strftime("%Y-%m-%d %H:%M:%S")
+    table = ScheduleTable.from_entries({**letter["row"], "send_time": send_time} for letter in letters)
+    for letter in letters:
+        # The failed send is finished; let the row be scheduled again under the same id
+        pending = scheduler.pending.get(letter["row_id"])
+        if pending is not None and pending[2].done():
+            del scheduler.pending[letter["row_id"]]
+    scheduler.dead_letters.remove([letter["row_id"] for letter in letters])
+
+    print(f"Replaying {len(letters)} dead letters.")
+    return await scheduler.dispatch(table.rows())
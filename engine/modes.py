@@ -0,0 +1,229 @@
+import os
+import math
+import time
+import atexit
+import asyncio
+import threading
+
+from shutdownSignals import stop_all, stop_on_signals
+
+from .core import LATE_GRACE
+from .nativeSchedule import NATIVE_SCHEDULE_SECONDS, slot_key
+from .prepare import PREPARE_AHEAD_MINUTES
+from .scheduleTable import ScheduleTable
+from .sessionStore import flush_sessions
+
+# Seconds between two reads of the source in daemon mode, and the length of
+# the window each read covers
+POLL_INTERVAL = int(os.environ.get("POLL_INTERVAL_SECONDS", "60"))
+
+# Only rows due within this many seconds are handled by one serverless invocation;
+# the rest are left for the next one (schedule the function at the same interval)
+SEND_WINDOW = int(os.environ.get("SEND_WINDOW_SECONDS", "60"))
+
+# Event loop shared by warm serverless invocations
+_loop = None
+
+
+async def _stopped_during(scheduler, awaitable):
+    """
+    Await something unless the scheduler is stopped first, in which case it is cancelled.
+    :return: True if the scheduler was stopped.
+    """
+    task = asyncio.ensure_future(awaitable)
+    stopped = asyncio.ensure_future(scheduler.until_stopped())
+    await asyncio.wait((task, stopped), return_when=asyncio.FIRST_COMPLETED)
+    stopped.cancel()
+    if task.done():
+        return False
+    task.cancel()
+    return True
+
+
+def _sent(results):
+    # dispatch returns counts and send tasks True or False; cancelled sends count as nothing
+    return sum(result for result in results if isinstance(result, int))
+
+
+async def run_once(scheduler, interval=POLL_INTERVAL):
+    """
+    Read the source once and send every row from now on, then return.
+    Rows are handed to the scheduler one interval ahead of their send time,
+    and idle gaps between rows are skipped. With NATIVE_SCHEDULE_SECONDS set,
+    far-future rows are scheduled on Telegram and the run ends without waiting for them.
+    Sends checkpointed by an earlier shutdown are resumed first, and SIGTERM shuts the
+    run down gracefully.
+    :param scheduler: Scheduler instance.
+    :param interval: Window length in seconds.
+    :return: Number of messages sent.
+    """
+    stop_on_signals()
+    tasks = await scheduler.resume()
+    now = time.time()
+    try:
+        table = await asyncio.to_thread(scheduler.load, now - LATE_GRACE, math.inf)
+    except Exception as e:
+        print(f"Error loading schedules: {e}")
+        if not tasks:
+            await scheduler.close()
+            return 0
+        table = ScheduleTable()
+
+    horizon = math.inf
+    if scheduler.native is not None:
+        await scheduler.hand_off(table.due(now, math.inf))
+        # Stop waiting once everything left is scheduled on Telegram's side
+        horizon = now + NATIVE_SCHEDULE_SECONDS
+        for row in table.due(horizon, math.inf):
+            entry = row.to_entry()
+            entry["phone"] = entry["phone"] or scheduler.default_phone
+            if slot_key(entry) not in scheduler.native:
+                horizon = math.inf
+                break
+
+    if not len(table) and not tasks:
+        print("No schedules found.")
+        await scheduler.close()
+        return 0
+
+    tasks.append(asyncio.create_task(scheduler.dispatch(table.due(now - LATE_GRACE, now + interval))))
+    start = now + interval
+
+    while not scheduler.stopping:
+        next_time = table.next_time(start)
+        if next_time is None or next_time >= horizon:
+            break
+        if next_time >= start + interval:
+            start = next_time
+
+        # Dispatch one interval ahead so connect and prepare finish before the first send
+        delay = start - interval - time.time()
+        if delay > 0 and await _stopped_during(scheduler, asyncio.sleep(delay)):
+            break
+        tasks.append(asyncio.create_task(scheduler.dispatch(table.due(start, start + interval))))
+        start += interval
+
+    results = asyncio.gather(*tasks, return_exceptions=True)
+    if scheduler.stopping or await _stopped_during(scheduler, asyncio.shield(results)):
+        await scheduler.shutdown()
+    else:
+        await scheduler.close()
+    return _sent(await results)
+
+
+async def run_daemon(scheduler, interval=POLL_INTERVAL):
+    """
+    Re-read the source every interval, or as soon as a watched file changes, and
+    dispatch the rows due in the next interval plus PREPARE_AHEAD_MINUTES, so edits
+    to the schedule are picked up without a restart. Runs until stopped (SIGTERM or Scheduler.stop),
+    then shuts down gracefully; the next start resumes from the checkpoint.
+    :param scheduler: Scheduler instance.
+    :param interval: Seconds between reads.
+    """
+    stop_on_signals()
+    tasks = set(await scheduler.resume())
+    for task in tasks:
+        task.add_done_callback(tasks.discard)
+
+    while not scheduler.stopping:
+        now = time.time()
+        # Rows are dispatched PREPARE_AHEAD_MINUTES before the window they fall in, so even
+        # the first rows of a window are connected and prepared before their send time
+        end = now + interval + PREPARE_AHEAD_MINUTES * 60
+        try:
+            if scheduler.native is not None:
+                # One read covers both ranges; handed off first, so dispatch skips the rows Telegram sends
+                table = await asyncio.to_thread(scheduler.load, now - LATE_GRACE, math.inf)
+                await scheduler.hand_off(table.due(now, math.inf))
+                rows = table.due(now - LATE_GRACE, end)
+            else:
+                rows = (await asyncio.to_thread(scheduler.load, now - LATE_GRACE, end)).rows()
+            # Passing the range lets dispatch cancel sends whose rows were removed
+            task = asyncio.create_task(scheduler.dispatch(rows, now - LATE_GRACE, end))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        except Exception as e:
+            print(f"Error loading schedules: {e}")
+
+        scheduler.status.flush()
+        print("Waiting for the next check...")
+        remaining = max(0, now + interval - time.time())
+        # Watched sources (see FileSource) cut the wait short when they change
+        wait_for_change = getattr(scheduler.source, "wait_for_change", None)
+        if wait_for_change is not None:
+            await _stopped_during(scheduler, wait_for_change(remaining))
+        else:
+            await _stopped_during(scheduler, asyncio.sleep(remaining))
+
+    await scheduler.shutdown()
+
+
+def get_loop():
+    """
+    Return the event loop shared by warm serverless invocations.
+    Telethon clients are bound to the loop they connected on, so reusing
+    connected clients requires reusing the loop as well.
+    """
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+async def _run_window(scheduler, window):
+    tasks = await scheduler.resume()
+    now = time.time()
+    # Continue where the previous window ended, so rows between two invocations are not
+    # lost to cron jitter; a cold start looks back LATE_GRACE and skips what the status
+    # feed shows as already sent
+    start = max(now - LATE_GRACE, scheduler.window_end or 0)
+    end = now + window
+    if scheduler.native is not None:
+        ahead = await asyncio.to_thread(scheduler.load, start, math.inf)
+        await scheduler.hand_off(ahead.due(math.ceil(now), math.inf))
+        rows = ahead.due(start, end)
+    else:
+        rows = (await asyncio.to_thread(scheduler.load, start, end)).rows()
+    scheduler.window_end = end
+    if not rows and not tasks:
+        print("No schedules due in this window.")
+        scheduler.finished.set()
+        return 0
+    results = asyncio.gather(scheduler.dispatch(rows), *tasks, return_exceptions=True)
+    if await _stopped_during(scheduler, asyncio.shield(results)):
+        await scheduler.shutdown()
+        return _sent(await results)
+    scheduler.status.flush()
+    flush_sessions()
+    scheduler.finished.set()
+    return _sent(await results)
+
+
+def run_serverless(scheduler, window=SEND_WINDOW):
+    """
+    Send the rows due up to now + window and return once they are out. Each window
+    starts where the previous one ended (at most LATE_GRACE ago), so late invocations
+    do not skip rows. Keep the scheduler at module level so warm invocations reuse
+    its clients and its record of what was sent.
+    :param scheduler: Scheduler instance.
+    :param window: Window length in seconds.
+    :return: Number of messages sent.
+    """
+    return get_loop().run_until_complete(_run_window(scheduler, window))
+
+
+def start_background(scheduler, interval=POLL_INTERVAL):
+    """
+    Run the daemon mode in a background thread with its own event loop,
+    for hosts such as Flask or Streamlit that own the main thread.
+    :param scheduler: Scheduler instance.
+    :param interval: Seconds between reads.
+    :return: The started daemon Thread.
+    """
+    thread = threading.Thread(target=asyncio.run, args=(run_daemon(scheduler, interval),), name="scheduler", daemon=True)
+    thread.start()
+    return thread
+
+
+# Hosts that exit normally (e.g. Streamlit on SIGTERM) drain their background schedulers first
+atexit.register(stop_all)
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import sqlite3
+from datetime import datetime
+
+from .paths import writable_path
+from .prepare import content_key, prepare_entry, row_id, send_prepared
+
+# Rows due further ahead than this many seconds are handed to Telegram's own
+# scheduled messages; 0 keeps every send in this process
+NATIVE_SCHEDULE_SECONDS = int(os.environ.get("NATIVE_SCHEDULE_SECONDS", "0"))
+
+# Scheduled messages due within this many seconds are left alone, as Telegram may be sending them
+NATIVE_MARGIN = 30
+
+# Database of the messages handed to Telegram
+SCHEDULED_DB = os.environ.get("SCHEDULED_DB", "scheduled.db")
+
+
+def slot_key(entry):
+    """
+    Identify the scheduled message of a row by its row_id(), so several messages to the
+    same chat at the same time each get their own. With an "id" column a row whose text
+    or media changes keeps its slot, so the change becomes an edit.
+    :param entry: Schedule row dictionary with its phone filled in.
+    :return: String key.
+    """
+    return row_id(entry)
+
+
+class ScheduledStore:
+    """
+    Messages scheduled on Telegram's side, by slot, kept in SQLite and mirrored in memory.
+    """
+
+    def __init__(self, path=SCHEDULED_DB):
+        self.path = writable_path(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scheduled ("
+            "slot TEXT PRIMARY KEY, phone TEXT, group_id TEXT, send_at INTEGER, message TEXT, media TEXT, message_ids TEXT, key TEXT)"
+        )
+        # Databases written before rows were compared by content_key()
+        if "key" not in {column[1] for column in self._conn.execute("PRAGMA table_info(scheduled)")}:
+            self._conn.execute("ALTER TABLE scheduled ADD COLUMN key TEXT")
+        self.slots = {}
+        rows = self._conn.execute("SELECT slot, phone, group_id, send_at, message, media, message_ids, key FROM scheduled")
+        for slot, phone, group_id, send_at, message, media, message_ids, key in rows:
+            self.slots[slot] = {
+                "phone": phone,
+                "group_id": json.loads(group_id),
+                "send_at": send_at,
+                "message": message,
+                "media": json.loads(media),
+                "message_ids": json.loads(message_ids),
+                "key": key,
+            }
+
+    def __contains__(self, slot):
+        return slot in self.slots
+
+    def put(self, slot, record):
+        """
+        Record a scheduled message.
+        :param slot: slot_key() of the row.
+        :param record: Dictionary with phone, group_id, send_at, message, media, message_ids
+                       and the content_key() of the row.
+        """
+        self.slots[slot] = record
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scheduled VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (slot, record["phone"], json.dumps(record["group_id"]), record["send_at"], record["message"],
+                 json.dumps(record["media"]), json.dumps(record["message_ids"]), record.get("key")),
+            )
+
+    def remove(self, *slots):
+        """
+        Forget scheduled messages.
+        :param slots: slot_key() values.
+        """
+        for slot in slots:
+            self.slots.pop(slot, None)
+        with self._conn:
+            self._conn.executemany("DELETE FROM scheduled WHERE slot = ?", [(slot,) for slot in slots])
+
+
+def _media(entry):
+    media = entry.get("media")
+    return list(media) if isinstance(media, tuple) else media
+
+
+async def _schedule(scheduler, client, slot, send_at, entry):
+    from telethon import errors
+
+    await scheduler.rates.wait(entry["phone"])
+    try:
+        item = await prepare_entry(client, entry)
+        sent = await send_prepared(client, item, schedule=datetime.fromtimestamp(send_at))
+    except errors.FloodWaitError as e:
+        scheduler.rates.backoff(entry["phone"], e.seconds)
+        return False
+    except Exception as e:
+        print(f"Failed to schedule message for {entry['group_id']} on Telegram: {e}")
+        return False
+
+    messages = sent if isinstance(sent, list) else [sent]
+    scheduler.native.put(slot, {
+        "phone": entry["phone"],
+        "group_id": entry["group_id"],
+        "send_at": send_at,
+        "message": entry["message"],
+        "media": _media(entry),
+        "message_ids": [message.id for message in messages],
+        "key": content_key(entry),
+    })
+    print(f"Scheduled message for {entry['group_id']} on Telegram at {entry['send_time']}")
+    return True
+
+
+async def _delete(client, slot, record):
+    from telethon import functions
+
+    entity = await client.get_input_entity(record["group_id"])
+    await client(functions.messages.DeleteScheduledMessagesRequest(entity, record["message_ids"]))
+    print(f"Deleted scheduled message for {record['group_id']} at {datetime.fromtimestamp(record['send_at'])}")
+
+
+async def hand_off(scheduler, rows):
+    """
+    Reconcile Telegram's scheduled messages with the rows still ahead: schedule new
+    rows beyond NATIVE_SCHEDULE_SECONDS, edit rows whose text changed, re-create rows
+    whose media changed and delete the ones removed from the schedule.
+    Work is proportional to the changes; unchanged rows cost a dictionary lookup.
+    :param scheduler: Scheduler instance with a native store.
+    :param rows: Every ScheduleRow from now on.
+    :return: Number of scheduled messages created, edited or deleted.
+    """
+    from .core import LATE_GRACE
+
+    now = time.time()
+    store = scheduler.native
+    wanted = {}
+    for row in rows:
+        entry = row.to_entry()
+        entry["phone"] = entry["phone"] or scheduler.default_phone
+        if entry["phone"]:
+            wanted[slot_key(entry)] = (row.send_at, entry)
+
+    # Telegram has sent these; the record is kept while dispatch still accepts the row
+    # as late (LATE_GRACE), so a reload never sends it a second time
+    expired = [slot for slot, record in store.slots.items() if record["send_at"] < now - LATE_GRACE]
+    if expired:
+        store.remove(*expired)
+
+    changes = []
+    for slot, record in store.slots.items():
+        if record["send_at"] < now + NATIVE_MARGIN:
+            continue
+        if slot not in wanted:
+            changes.append((slot, record, None))
+            continue
+        send_at, entry = wanted[slot]
+        # Records from before the key was stored are compared by text and media only
+        if (record["message"], record["media"]) != (entry["message"], _media(entry)) \
+                or record.get("key") not in (None, content_key(entry)):
+            changes.append((slot, record, entry))
+    # Rows already admitted by dispatch are sent from here and must not be scheduled as well
+    new = [(slot, send_at, entry) for slot, (send_at, entry) in wanted.items()
+           if slot not in store and slot not in scheduler.pending and send_at >= now + NATIVE_SCHEDULE_SECONDS]
+
+    phones = {record["phone"] for _, record, _ in changes} | {entry["phone"] for _, _, entry in new}
+    if not phones:
+        return 0
+    clients = await scheduler.connect(phones)
+
+    from telethon import errors
+
+    count = 0
+    for slot, record, entry in changes:
+        client = clients.get(record["phone"])
+        if client is None:
+            continue
+        try:
+            if entry is not None and record["media"] == _media(entry) and len(record["message_ids"]) == 1:
+                item = await prepare_entry(client, entry)
+                try:
+                    await client.edit_message(item["entity"], record["message_ids"][0], item["text"],
+                                              formatting_entities=item["entities"], schedule=datetime.fromtimestamp(record["send_at"]))
+                except errors.MessageNotModifiedError:
+                    pass  # Only fields that do not change the text were edited, e.g. the priority
+                store.put(slot, {**record, "message": entry["message"], "key": content_key(entry)})
+                print(f"Edited scheduled message for {record['group_id']}")
+            else:
+                await _delete(client, slot, record)
+                store.remove(slot)
+                if entry is not None:
+                    new.append((slot, record["send_at"], entry))
+            count += 1
+        except Exception as e:
+            print(f"Failed to update scheduled message for {record['group_id']}: {e}")
+
+    for slot, send_at, entry in new:
+        client = clients.get(entry["phone"])
+        if client is not None and await _schedule(scheduler, client, slot, send_at, entry):
+            count += 1
+    return count
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+
+def writable_path(path):
+    """
+    Return path if its directory is writable, otherwise the same file name in the temp directory.
+    :param path: Preferred file path.
+    :return: A path that can be written to.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if os.access(directory, os.W_OK):
+        return path
+    return os.path.join(tempfile.gettempdir(), os.path.basename(path))
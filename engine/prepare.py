@@ -0,0 +1,189 @@
+import os
+import json
+import asyncio
+import hashlib
+from urllib.parse import urlparse
+
+from .templates import render_entry
+from .tracing import span
+
+# Minutes before their send time that daemon mode loads and prepares rows (peers, uploads, markup)
+PREPARE_AHEAD_MINUTES = int(os.environ.get("PREPARE_AHEAD_MINUTES", "5"))
+
+# Telegram limits after markup has been parsed
+MAX_MESSAGE_LENGTH = 4096
+MAX_CAPTION_LENGTH = 1024
+
+
+def entry_key(entry):
+    """
+    Identify a schedule entry by the fields that define what gets sent.
+    :param entry: Schedule row.
+    :return: Hashable key.
+    """
+    return (entry.get("phone"), entry.get("group_id"), entry.get("send_time"), entry.get("message"), entry.get("media"))
+
+
+def content_key(entry):
+    """
+    Everything about a schedule entry that affects its send: entry_key() plus the
+    template variables, counter, priority and deadline. Used to tell edited rows from
+    unchanged ones, including rows whose identity comes from an "id" column.
+    :param entry: Schedule row.
+    :return: String key.
+    """
+    return json.dumps(
+        [entry_key(entry), entry.get("vars") or (), entry.get("counter", 1), entry.get("priority"), entry.get("deadline")],
+        default=str,
+    )
+
+
+def row_id(entry):
+    """
+    Identity of a schedule entry across reloads. With an "id" column it is the id plus
+    the target and survives edits to the content, so an edit replaces the pending send.
+    Without one it includes a hash of the content, so several messages to the same chat
+    at the same time stay separate rows, and an edited row counts as removed and re-added.
+    :param entry: Schedule row.
+    :return: String key.
+    """
+    if entry.get("id") not in (None, ""):
+        return f"{entry['id']}:{entry.get('group_id')}"
+    content = json.dumps([entry_key(entry), entry.get("vars") or ()], default=str)
+    digest = hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+    return f"{entry.get('phone')}|{entry.get('group_id')}|{entry.get('send_time')}|{digest}"
+
+
+def parse_text(message, limit):
+    """
+    Parse markdown markup once and check the resulting length.
+    :param message: Message text with markdown markup.
+    :param limit: Maximum length of the parsed text.
+    :return: Tuple (text, formatting entities).
+    :raises: ValueError if the markup is invalid or the text is too long.
+    """
+    from telethon.extensions import markdown
+
+    try:
+        text, entities = markdown.parse(message)
+    except Exception as e:
+        raise ValueError(f"invalid markup: {e}")
+    if len(text) > limit:
+        raise ValueError(f"text is {len(text)} characters long, the limit is {limit}")
+    return text, entities
+
+
+def fetch_media(media):
+    """
+    Download remote media into memory; local paths are returned unchanged.
+    :param media: URL or local file path.
+    :return: Tuple (bytes or path, file name).
+    """
+    parsed = urlparse(media)
+    if parsed.scheme not in ("http", "https"):
+        return media, os.path.basename(media)
+
+    import requests
+
+    response = requests.get(media, timeout=60)
+    response.raise_for_status()
+    name = os.path.basename(parsed.path) or "media"
+    if "." not in name:
+        # Let Telethon detect photos by extension so they are not sent as documents
+        subtype = response.headers.get("Content-Type", "").split(";")[0].split("/")[-1]
+        name = f"{name}.{subtype or 'bin'}"
+    return response.content, name
+
+
+async def upload_media(client, entity, media, album=False):
+    """
+    Fetch and upload one media file.
+    :param client: Connected TelegramClient instance.
+    :param entity: Input entity of the target chat.
+    :param media: URL or local file path.
+    :param album: Whether the file is part of an album; album photos are registered
+                  with Telegram right away so the send itself is a single RPC.
+    :return: Uploaded file, or input media for album photos.
+    """
+    from telethon import functions, types, utils
+
+    with span("fetch_media", media=media):
+        data, name = await asyncio.to_thread(fetch_media, media)
+    with span("upload", media=media):
+        file = await client.upload_file(data, file_name=name)
+        if album and utils.is_image(name):
+            result = await client(functions.messages.UploadMediaRequest(entity, types.InputMediaUploadedPhoto(file)))
+            return utils.get_input_media(result.photo)
+    return file
+
+
+async def prepare_entry(client, entry):
+    """
+    Do everything except the final send for one schedule entry:
+    resolve the target, render the template, fetch and upload media, and parse
+    and validate the text.
+    :param client: Connected TelegramClient instance.
+    :param entry: Schedule row.
+    :return: Dictionary with the entity, rendered markup, text, formatting entities and
+             uploaded file (a list for albums, whose parts are uploaded in parallel).
+    :raises: ValueError for rows that can never be sent; other exceptions for transient failures.
+    """
+    media = entry.get("media")
+    with span("render", group_id=entry.get("group_id")):
+        markup = await render_entry(client, entry)
+        text, entities = parse_text(markup, MAX_CAPTION_LENGTH if media else MAX_MESSAGE_LENGTH)
+
+    with span("resolve", group_id=entry.get("group_id")):
+        entity = await client.get_input_entity(entry.get("group_id"))
+
+    file = None
+    if isinstance(media, tuple):
+        file = list(await asyncio.gather(*(upload_media(client, entity, part, album=True) for part in media)))
+    elif media:
+        file = await upload_media(client, entity, media)
+
+    return {"entity": entity, "markup": markup, "text": text, "entities": entities, "file": file}
+
+
+async def prepare_entries(clients, entries):
+    """
+    Prepare several entries concurrently.
+    Entries that fail for a transient reason are left out of both results; their
+    send falls back to doing the work itself.
+    :param clients: Dictionary with phone numbers as keys and connected clients as values.
+    :param entries: Schedule rows to stage, each with its row_id.
+    :return: Tuple (prepared, rejected): dictionaries keyed by row_id holding
+             the prepared sends and the reasons rows can never be sent.
+    """
+    prepared = {}
+    rejected = {}
+    todo = [entry for entry in entries if entry.get("phone") in clients]
+
+    async def stage(entry):
+        try:
+            prepared[entry["row_id"]] = await prepare_entry(clients[entry.get("phone")], entry)
+        except ValueError as e:
+            rejected[entry["row_id"]] = str(e)
+            print(f"Schedule entry for {entry.get('group_id')} cannot be sent: {e}")
+        except Exception as e:
+            print(f"Failed to prepare message for {entry.get('group_id')}: {e}")
+
+    await asyncio.gather(*(stage(entry) for entry in todo))
+    return prepared, rejected
+
+
+async def send_prepared(client, item, schedule=None):
+    """
+    Send a prepared message; only the final send RPC remains.
+    :param client: Connected TelegramClient instance.
+    :param item: Dictionary returned by prepare_entry.
+    :param schedule: Optional datetime to have Telegram send the message later.
+    :return: The sent Message, or a list of them for albums.
+    """
+    if isinstance(item["file"], list):
+        # Albums take their caption as markup; Telegram groups up to 10 parts per message
+        return await client.send_file(item["entity"], item["file"], caption=item["markup"], schedule=schedule)
+    if item["file"] is not None:
+        return await client.send_file(item["entity"], item["file"], caption=item["text"], formatting_entities=item["entities"], schedule=schedule)
+    return await client.send_message(item["entity"], item["text"], formatting_entities=item["entities"], schedule=schedule)
+
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import asyncio
+
+from .paths import writable_path
+from .sessionStore import FLUSH_INTERVAL
+
+# Send rate of accounts without history, in messages per second
+INITIAL_RATE = float(os.environ.get("INITIAL_SEND_RATE", "1"))
+
+# Bounds of a learned rate, in messages per second
+MIN_RATE = float(os.environ.get("MIN_SEND_RATE", str(1 / 60)))
+MAX_RATE = float(os.environ.get("MAX_SEND_RATE", "30"))
+
+# Added to a rate after each successful send, and the factor applied on a flood wait
+RATE_INCREASE = float(os.environ.get("SEND_RATE_INCREASE", "0.05"))
+RATE_DECREASE = float(os.environ.get("SEND_RATE_DECREASE", "0.5"))
+
+# Learned rates survive restarts in this file
+RATES_FILE = os.environ.get("SEND_RATES_FILE", "send_rates.json")
+
+
+class RetryLater(Exception):
+    """
+    Raised by a send that Telegram asked to repeat after a wait.
+    """
+
+    def __init__(self, seconds, reason):
+        super().__init__(f"{reason}, retry in {seconds}s")
+        self.seconds = seconds
+
+
+def chat_key(phone, group_id):
+    """
+    Key of the limit that applies to one account sending to one chat.
+    :param phone: Account phone number.
+    :param group_id: Group ID or username.
+    :return: String key.
+    """
+    return f"{phone}:{group_id}"
+
+
+class RateController:
+    """
+    AIMD send rates per account, and per chat once a chat has pushed back:
+    every successful send raises the rate a little, every FloodWait or slow mode
+    wait halves it and pauses that account or chat for the time Telegram asked.
+    """
+
+    def __init__(self, path=RATES_FILE, flush_interval=FLUSH_INTERVAL):
+        """
+        :param path: JSON file holding the learned rates (None keeps them in memory only).
+        :param flush_interval: Minimum seconds between two writes of the file.
+        """
+        self.path = writable_path(path) if path else None
+        self.flush_interval = flush_interval
+        # key -> [rate, earliest next send as epoch seconds]
+        self.limits = {}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self.load()
+
+    def load(self):
+        """
+        Read the learned rates; a missing or damaged file starts from scratch.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            self.limits = {key: [float(rate), float(next_at)] for key, (rate, next_at) in data.items()}
+        except Exception as e:
+            print(f"Ignoring unreadable send rates in {self.path}: {e}")
+
+    def save(self, force=False):
+        """
+        Write the learned rates if they changed, at most every flush_interval seconds.
+        :param force: Write regardless of the interval.
+        """
+        if not self.path or not self._dirty:
+            return
+        if not force and time.monotonic() - self._saved_at < self.flush_interval:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self.limits, file)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        except OSError as e:
+            print(f"Failed to save send rates: {e}")
+
+    def rate(self, key):
+        """
+        :param key: Phone number or chat_key().
+        :return: Current rate in messages per second, or None for chats without a limit.
+        """
+        limit = self.limits.get(key)
+        return limit[0] if limit else None
+
+    async def wait(self, key, create=True):
+        """
+        Wait for the next send slot of an account or chat and claim it.
+        :param key: Phone number or chat_key().
+        :param create: Start a limit at INITIAL_RATE if the key has none.
+        """
+        limit = self.limits.get(key)
+        if limit is None:
+            if not create:
+                return
+            limit = self.limits[key] = [INITIAL_RATE, 0.0]
+        now = time.time()
+        start = max(now, limit[1])
+        limit[1] = start + 1 / limit[0]
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def success(self, *keys):
+        """
+        Additive increase after a successful send.
+        :param keys: Keys whose limits took part in the send.
+        """
+        for key in keys:
+            limit = self.limits.get(key)
+            if limit is not None and limit[0] < MAX_RATE:
+                limit[0] = min(MAX_RATE, limit[0] + RATE_INCREASE)
+                self._dirty = True
+        self.save()
+
+    def backoff(self, key, seconds):
+        """
+        Multiplicative decrease after Telegram asked to wait.
+        :param key: Phone number or chat_key().
+        :param seconds: Wait requested by Telegram.
+        """
+        limit = self.limits.setdefault(key, [INITIAL_RATE, 0.0])
+        limit[0] = max(MIN_RATE, limit[0] * RATE_DECREASE)
+        limit[1] = max(limit[1], time.time() + seconds)
+        self._dirty = True
+        print(f"Backing off {key} for {seconds}s, rate is now {limit[0]:.3f}/s")
+        self.save(force=True)
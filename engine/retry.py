@@ -0,0 +1,43 @@
+import os
+import random
+
+# Attempts after the first one for sends failing with a transient error
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", "5"))
+
+# Backoff of the first retry and the longest backoff, in seconds
+RETRY_BASE_SECONDS = float(os.environ.get("RETRY_BASE_SECONDS", "2"))
+RETRY_MAX_SECONDS = float(os.environ.get("RETRY_MAX_SECONDS", "300"))
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+
+def classify(error):
+    """
+    Decide whether repeating a failed send can succeed.
+    Requests Telegram rejected as invalid (400), forbidden (403) or unauthorized (401),
+    and ValueErrors such as unknown chats or bad templates, are permanent;
+    server errors, timeouts and network errors are transient.
+    :param error: Exception raised by the send.
+    :return: TRANSIENT or PERMANENT.
+    """
+    from telethon import errors
+
+    if isinstance(error, (errors.BadRequestError, errors.ForbiddenError, errors.UnauthorizedError, errors.NotFoundError)):
+        return PERMANENT
+    if isinstance(error, (ValueError, TypeError)):
+        return PERMANENT
+    return TRANSIENT
+
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS):
+    """
+    Exponential backoff with jitter, so retries of many sends do not arrive together.
+    :param attempt: Number of the retry, starting at 0.
+    :param base: Delay of the first retry in seconds.
+    :param cap: Longest delay in seconds.
+    :return: Delay in seconds, between half and all of min(cap, base * 2 ** attempt).
+    """
+    delay = min(cap, base * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
@@ -0,0 +1,388 @@
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from .templates import row_variables, split_targets
+
+# Priority classes of the "priority" column; lower values are sent first
+PRIORITIES = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+DEFAULT_PRIORITY = PRIORITIES["normal"]
+
+# Rows without a "deadline" column must be sent within this many seconds of their send time
+DEADLINE_SECONDS = int(os.environ.get("DEADLINE_SECONDS", "600"))
+
+# Local epoch of each "YYYY-MM-DD HH" seen; DST changes fall on hour boundaries
+_hour_epochs = {}
+
+
+def parse_send_time(send_time):
+    """
+    Convert a send_time string to a local epoch timestamp without calling strptime per row.
+    :param send_time: Time in '%Y-%m-%d %H:%M:%S' or '%Y-%m-%d %H:%M' format.
+    :return: Epoch seconds as int.
+    :raises: ValueError if the string is not in a supported format.
+    """
+    if not isinstance(send_time, str) or len(send_time) not in (16, 19) or send_time[13] != ":":
+        raise ValueError(f"Invalid send_time format: {send_time}")
+
+    hour_key = send_time[:13]
+    base = _hour_epochs.get(hour_key)
+    if base is None:
+        base = int(datetime.strptime(hour_key, "%Y-%m-%d %H").timestamp())
+        _hour_epochs[hour_key] = base
+
+    try:
+        minute = int(send_time[14:16])
+        second = int(send_time[17:19]) if len(send_time) == 19 else 0
+    except ValueError:
+        raise ValueError(f"Invalid send_time format: {send_time}")
+    if not (0 <= minute < 60 and 0 <= second < 60) or (len(send_time) == 19 and send_time[16] != ":"):
+        raise ValueError(f"Invalid send_time format: {send_time}")
+    return base + minute * 60 + second
+
+
+def parse_priority(value):
+    """
+    Convert a "priority" cell to a priority class.
+    :param value: Class name (urgent, high, normal, low), a number, or empty.
+    :return: Priority class as int, lower is more important.
+    """
+    if value is None or value == "":
+        return DEFAULT_PRIORITY
+    if isinstance(value, str):
+        name = value.strip().lower()
+        if name in PRIORITIES:
+            return PRIORITIES[name]
+        try:
+            value = int(name)
+        except ValueError:
+            return DEFAULT_PRIORITY
+    return max(0, min(int(value), 127))
+
+
+def parse_deadline(value, send_at):
+    """
+    Convert a "deadline" cell to the latest acceptable send time.
+    :param value: Time in send_time format, seconds after the send time, or empty.
+    :param send_at: Send time as epoch seconds.
+    :return: Epoch seconds as int.
+    """
+    if value is None or value == "":
+        return send_at + DEADLINE_SECONDS
+    if isinstance(value, str) and ":" in value:
+        try:
+            return max(send_at, parse_send_time(value))
+        except ValueError:
+            return send_at + DEADLINE_SECONDS
+    try:
+        return send_at + max(0, int(float(value)))
+    except (TypeError, ValueError):
+        return send_at + DEADLINE_SECONDS
+
+
+def split_media(media):
+    """
+    Normalize a "media" cell: a list, or one URL or path per line, becomes an album.
+    :param media: Media cell value.
+    :return: None, a single URL or path, or a tuple of them for an album.
+    """
+    if isinstance(media, str) and "\n" in media:
+        media = media.split("\n")
+    if isinstance(media, (list, tuple)):
+        parts = tuple(part.strip() for part in media if isinstance(part, str) and part.strip())
+        if len(parts) > 1:
+            return parts
+        media = parts[0] if parts else None
+    return media or None
+
+
+def rows_in_horizon(entries, start, end):
+    """
+    Validate and filter sheet rows as they arrive, keeping only the ones to schedule.
+    Rows marked as sent, incomplete rows and rows outside [start, end) are discarded.
+    :param entries: Iterable of schedule dictionaries, e.g. a streaming parser.
+    :param start: Horizon start as epoch seconds.
+    :param end: Horizon end as epoch seconds.
+    :return: Generator of (send_at, entry) tuples.
+    """
+    for entry in entries:
+        if not isinstance(entry, dict) or str(entry.get("status", "")).lower() == "sent":
+            continue
+        if not (entry.get("send_time") and entry.get("group_id") and entry.get("message")):
+            continue
+        try:
+            send_at = parse_send_time(entry.get("send_time"))
+        except ValueError:
+            continue
+        if start <= send_at < end:
+            yield send_at, entry
+
+
+class ScheduleRow:
+    """
+    One schedule row, materialized from a ScheduleTable on demand.
+    """
+
+    __slots__ = ("index", "send_at", "phone", "group_id", "message", "media", "priority", "deadline", "variables", "counter", "sheet_id")
+
+    def __init__(self, index, send_at, phone, group_id, message, media, priority=DEFAULT_PRIORITY, deadline=None, variables=(), counter=1, sheet_id=None):
+        self.index = index
+        self.send_at = send_at
+        self.phone = phone
+        self.group_id = group_id
+        self.message = message
+        self.media = media
+        self.priority = priority
+        self.deadline = deadline if deadline is not None else send_at + DEADLINE_SECONDS
+        self.variables = variables
+        self.counter = counter
+        self.sheet_id = sheet_id
+
+    def to_entry(self):
+        """
+        Return the row as a sheet-style dictionary.
+        :return: Dictionary with the ScheduleMessage column names.
+        """
+        return {
+            "phone": self.phone,
+            "group_id": self.group_id,
+            "send_time": datetime.fromtimestamp(self.send_at).strftime("%Y-%m-%d %H:%M:%S"),
+            "message": self.message,
+            "media": self.media,
+            "priority": self.priority,
+            "deadline": self.deadline,
+            "vars": self.variables,
+            "counter": self.counter,
+            "id": self.sheet_id,
+        }
+
+
+# Per-row arrays of a ScheduleTable
+COLUMNS = ("times", "phones", "groups", "messages", "media", "priorities", "deadlines", "variables", "counters", "ids")
+
+
+class ScheduleTable:
+    """
+    Column-oriented schedule storage for very large sheets.
+
+    Times are epoch ints in an array, phones, group ids and media are interned
+    into one string pool and messages and template variables are deduplicated,
+    so each row costs about 40 bytes plus its unique strings. A broadcast row
+    with several targets becomes one table row per target sharing the message.
+    """
+
+    def __init__(self):
+        self.times = array("q")
+        self.phones = array("I")
+        self.groups = array("I")
+        self.messages = array("I")
+        self.media = array("I")
+        self.priorities = array("b")
+        self.deadlines = array("q")
+        self.variables = array("I")
+        self.counters = array("I")
+        self.ids = array("I")
+        # Index 0 is "no value" in both pools
+        self._strings = [None]
+        self._string_ids = {}
+        self._bodies = [None]
+        self._body_ids = {}
+        self._sorted = True
+
+    def __len__(self):
+        return len(self.times)
+
+    def _intern(self, value):
+        if value is None or value == "":
+            return 0
+        if isinstance(value, str):
+            # Numeric group ids stay ints so Telethon treats them as ids, not usernames
+            value = sys.intern(value)
+        index = self._string_ids.get(value)
+        if index is None:
+            index = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return index
+
+    def _body(self, message):
+        # Messages and variable tuples share this pool
+        if not message:
+            return 0
+        index = self._body_ids.get(message)
+        if index is None:
+            index = self._body_ids[message] = len(self._bodies)
+            self._bodies.append(message)
+        return index
+
+    def append(self, send_at, phone, group_id, message, media=None, priority=DEFAULT_PRIORITY, deadline=None, variables=(), counter=1, sheet_id=None):
+        """
+        Add one row.
+        :param send_at: Send time as epoch seconds.
+        :param phone: Account phone number.
+        :param group_id: Group ID or username.
+        :param message: Text message.
+        :param media: Optional media URL or path, or a tuple of them for an album.
+        :param priority: Priority class, lower is more important.
+        :param deadline: Latest acceptable send time as epoch seconds (default is DEADLINE_SECONDS after send_at).
+        :param variables: Template variables as a tuple of (name, value) pairs.
+        :param counter: Position of the target within its broadcast row.
+        :param sheet_id: Value of the row's "id" column, if the sheet has one.
+        :return: Index of the new row.
+        """
+        if self.times and send_at < self.times[-1]:
+            self._sorted = False
+        self.times.append(int(send_at))
+        self.phones.append(self._intern(phone))
+        self.groups.append(self._intern(group_id))
+        self.messages.append(self._body(message))
+        self.media.append(self._intern(media))
+        self.priorities.append(priority)
+        self.deadlines.append(int(deadline) if deadline is not None else int(send_at) + DEADLINE_SECONDS)
+        self.variables.append(self._body(variables))
+        self.counters.append(counter)
+        self.ids.append(self._intern(sheet_id))
+        return len(self.times) - 1
+
+    def add_entry(self, entry):
+        """
+        Add a sheet row given as a dictionary.
+        :param entry: Dictionary with send_time, group_id, message and optional phone, media,
+                      priority and deadline.
+        :return: True if the row was added, False if it is incomplete or malformed.
+        """
+        send_time = entry.get("send_time")
+        group_id = entry.get("group_id")
+        message = entry.get("message")
+        if not (send_time and group_id and message):
+            return False
+        try:
+            send_at = parse_send_time(send_time)
+        except ValueError:
+            return False
+        return self.append_entry(send_at, entry) > 0
+
+    def append_entry(self, send_at, entry):
+        """
+        Add a validated sheet row, one table row per target of its group_id cell.
+        :param send_at: Send time as epoch seconds.
+        :param entry: Schedule dictionary.
+        :return: Number of rows added.
+        """
+        priority = parse_priority(entry.get("priority"))
+        deadline = parse_deadline(entry.get("deadline"), send_at)
+        variables = row_variables(entry)
+        media = split_media(entry.get("media"))
+        targets = split_targets(entry.get("group_id"))
+        for counter, group_id in enumerate(targets, 1):
+            self.append(send_at, entry.get("phone"), group_id, entry.get("message"), media, priority, deadline, variables, counter, entry.get("id"))
+        return len(targets)
+
+    def extend(self, rows):
+        """
+        Add rows produced by rows_in_horizon.
+        :param rows: Iterable of (send_at, entry) tuples.
+        :return: Number of rows added.
+        """
+        count = 0
+        for send_at, entry in rows:
+            count += self.append_entry(send_at, entry)
+        return count
+
+    @classmethod
+    def from_entries(cls, entries):
+        """
+        Build a table from sheet rows, skipping invalid ones.
+        :param entries: Iterable of schedule dictionaries.
+        :return: Sorted ScheduleTable.
+        """
+        table = cls()
+        for entry in entries:
+            table.add_entry(entry)
+        table.sort()
+        return table
+
+    def sort(self):
+        """
+        Order the rows by send time so that range scans can use bisection.
+        """
+        if self._sorted:
+            return
+        order = sorted(range(len(self.times)), key=self.times.__getitem__)
+        for name in COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[i] for i in order)))
+        self._sorted = True
+
+    def row(self, index):
+        """
+        Materialize one row.
+        :param index: Row index.
+        :return: ScheduleRow.
+        """
+        return ScheduleRow(
+            index,
+            self.times[index],
+            self._strings[self.phones[index]],
+            self._strings[self.groups[index]],
+            self._bodies[self.messages[index]],
+            self._strings[self.media[index]],
+            self.priorities[index],
+            self.deadlines[index],
+            self._bodies[self.variables[index]] or (),
+            self.counters[index],
+            self._strings[self.ids[index]],
+        )
+
+    def due(self, start, end):
+        """
+        Return the rows with start <= send time < end.
+        :param start: Window start as epoch seconds.
+        :param end: Window end as epoch seconds.
+        :return: List of ScheduleRow.
+        """
+        self.sort()
+        first = bisect_left(self.times, start)
+        last = bisect_left(self.times, end, first)
+        return [self.row(index) for index in range(first, last)]
+
+    def next_time(self, after):
+        """
+        Return the earliest send time at or after a given time.
+        :param after: Epoch seconds.
+        :return: Epoch seconds, or None if no row is left.
+        """
+        self.sort()
+        index = bisect_left(self.times, after)
+        return self.times[index] if index < len(self.times) else None
+
+    def rows(self):
+        """
+        Materialize every row in send-time order.
+        :return: List of ScheduleRow.
+        """
+        self.sort()
+        return [self.row(index) for index in range(len(self.times))]
+
+    def drop_before(self, cutoff):
+        """
+        Discard rows scheduled before cutoff (already sent or missed).
+        :param cutoff: Epoch seconds.
+        :return: Number of rows removed.
+        """
+        self.sort()
+        count = bisect_left(self.times, cutoff)
+        if count:
+            for name in COLUMNS:
+                del getattr(self, name)[:count]
+        return count
+
+    def nbytes(self):
+        """
+        Approximate memory held by the table, including pooled strings.
+        :return: Size in bytes.
+        """
+        columns = sum(column.itemsize * len(column) for column in (getattr(self, name) for name in COLUMNS))
+        pools = sum(sys.getsizeof(value) for value in self._strings[1:]) + sum(sys.getsizeof(value) for value in self._bodies[1:])
+        return columns + pools + sys.getsizeof(self._string_ids) + sys.getsizeof(self._body_ids)
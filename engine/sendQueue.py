@@ -0,0 +1,139 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+
+# Sends that run at the same time per account
+SEND_CONCURRENCY = int(os.environ.get("SEND_CONCURRENCY", "1"))
+
+# Every this many seconds of waiting lifts a queued send by one priority class
+AGING_SECONDS = float(os.environ.get("AGING_SECONDS", "60"))
+
+# Sends this close to their deadline jump the queue regardless of priority
+ESCALATE_SECONDS = float(os.environ.get("ESCALATE_SECONDS", "10"))
+
+# What happens to a send that is still queued after its deadline: "escalate" sends it
+# anyway, ahead of everything else, "drop" gives up on it
+LATE_POLICY = os.environ.get("LATE_POLICY", "escalate")
+
+
+class _Item:
+    __slots__ = ("deadline", "args", "future", "taken")
+
+    def __init__(self, deadline, args, future):
+        self.deadline = deadline
+        self.args = args
+        self.future = future
+        self.taken = False
+
+
+class SendQueue:
+    """
+    Due sends of one account, handed to a fixed number of workers by priority class,
+    then earliest deadline. Waiting sends age into higher classes so low priorities
+    are not starved, and sends close to their deadline are taken first.
+    """
+
+    def __init__(self, send, concurrency=SEND_CONCURRENCY, late_policy=LATE_POLICY, pace=None):
+        """
+        :param send: Coroutine function performing one send and returning True on success.
+        :param pace: Optional coroutine function awaited before each send is taken, so the
+                     send chosen is the most urgent one when the account may send again.
+        :param concurrency: Number of workers.
+        :param late_policy: "escalate" or "drop" for sends past their deadline.
+        """
+        self.send = send
+        self.concurrency = max(1, concurrency)
+        self.late_policy = late_policy
+        self.pace = pace
+        self.dropped = 0
+        # (priority class + enqueue period, deadline, seq, item); the enqueue period
+        # implements aging without re-keying the heap
+        self._by_priority = []
+        # (deadline, seq, item)
+        self._by_deadline = []
+        self._seq = itertools.count()
+        self._available = None
+        self._workers = []
+        self._loop = None
+
+    def __len__(self):
+        return sum(1 for *_, item in self._by_deadline if not item.taken)
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._available = asyncio.Semaphore(0)
+        self._by_priority, self._by_deadline = [], []
+        self._workers = [loop.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def submit(self, priority, deadline, *args):
+        """
+        Queue one send and wait for its outcome.
+        :param priority: Priority class, lower is more important.
+        :param deadline: Latest acceptable send time as epoch seconds.
+        :param args: Arguments passed to the send function.
+        :return: Result of the send function, or None if the send was dropped.
+        """
+        self._start()
+        item = _Item(deadline, args, self._loop.create_future())
+        seq = next(self._seq)
+        heapq.heappush(self._by_priority, (priority + int(time.time() // AGING_SECONDS), deadline, seq, item))
+        heapq.heappush(self._by_deadline, (deadline, seq, item))
+        self._available.release()
+        return await item.future
+
+    def _take(self):
+        now = time.time()
+        while self._by_deadline:
+            deadline, _, item = self._by_deadline[0]
+            if item.taken:
+                heapq.heappop(self._by_deadline)
+                continue
+            if deadline - now > ESCALATE_SECONDS:
+                break
+            heapq.heappop(self._by_deadline)
+            item.taken = True
+            return item
+        while True:
+            *_, item = heapq.heappop(self._by_priority)
+            if not item.taken:
+                item.taken = True
+                return item
+
+    async def _work(self):
+        while True:
+            await self._available.acquire()
+            if self.pace is not None:
+                await self.pace()
+            item = self._take()
+            if item.future.done():
+                continue  # The caller gave up waiting
+            if item.deadline < time.time() and self.late_policy == "drop":
+                self.dropped += 1
+                print(f"Dropped a send that missed its deadline by {time.time() - item.deadline:.0f}s")
+                item.future.set_result(None)
+                continue
+            try:
+                result = await self.send(*item.args)
+            except Exception as e:
+                if not item.future.done():
+                    item.future.set_exception(e)
+                continue
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def close(self):
+        """
+        Stop the workers; sends still queued are cancelled.
+        """
+        for task in self._workers:
+            task.cancel()
+        for *_, item in self._by_deadline:
+            if not item.future.done():
+                item.future.cancel()
+        self._workers = []
+        self._by_priority, self._by_deadline = [], []
@@ -0,0 +1,286 @@
+import os
+import glob
+import json
+import time
+import sqlite3
+
+from .paths import writable_path
+
+# Session backend: "files" (one SQLite file per account, Telethon's default),
+# "sqlite:<path>" (one shared database) or "memory[:<snapshot path>]".
+SESSION_STORE = os.environ.get("SESSION_STORE", "sqlite:sessions.db")
+
+# Entity-cache writes are batched and flushed at most this often (seconds).
+FLUSH_INTERVAL = float(os.environ.get("SESSION_FLUSH_INTERVAL", "30"))
+
+# Optional JSON object {phone: string_session} used to seed the store, so
+# accounts can authorize on read-only or ephemeral filesystems.
+SEED_ENV = "TELEGRAM_SESSIONS"
+
+_store = None
+
+# StoredSession class, built on first use so importing the engine does not import Telethon
+_session_class = None
+
+
+def stored_session_class():
+    """
+    Return StoredSession: a Telethon session whose auth key and entity cache live in a SessionStore.
+    :return: Subclass of telethon.sessions.StringSession.
+    """
+    global _session_class
+    if _session_class is not None:
+        return _session_class
+
+    from telethon.sessions import StringSession
+
+    class StoredSession(StringSession):
+        def __init__(self, store, phone, string=None, entities=()):
+            super().__init__(string)
+            self._store = store
+            self._phone = phone
+            self._entities = set(entities)
+
+        def process_entities(self, tlo):
+            rows = set(self._entities_to_rows(tlo)) - self._entities
+            if rows:
+                self._entities |= rows
+                self._store.queue_entities(self._phone, rows)
+
+        def save(self):
+            string = super().save()
+            self._store.save_session(self._phone, string)
+            return string
+
+        def close(self):
+            self._store.flush()
+
+    _session_class = StoredSession
+    return _session_class
+
+
+class SessionStore:
+    """
+    Keeps the sessions of all accounts together, loading them in one pass and
+    writing entity-cache changes in batches. Subclasses implement the I/O.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._sessions = None
+        self._entities = {}
+        self._dirty_sessions = set()
+        self._pending_entities = {}
+        self._last_flush = time.monotonic()
+
+    def load_all(self):
+        """
+        Load every stored session and entity cache with a single read.
+        :return: Dictionary with phone numbers as keys and session strings as values.
+        """
+        if self._sessions is None:
+            self._sessions, self._entities = self._read_all()
+            seed = os.environ.get(SEED_ENV)
+            if seed:
+                for phone, string in json.loads(seed).items():
+                    self._sessions.setdefault(phone, string)
+        return self._sessions
+
+    def session(self, phone):
+        """
+        Return a Telethon session object for the given account.
+        :param phone: Account phone number.
+        :return: StoredSession backed by this store.
+        """
+        sessions = self.load_all()
+        return stored_session_class()(self, phone, sessions.get(phone) or None, self._entities.get(phone, ()))
+
+    def save_session(self, phone, string):
+        """
+        Record a new auth key for an account; written immediately since it is rare and vital.
+        :param phone: Account phone number.
+        :param string: Session string (see StringSession.save).
+        """
+        sessions = self.load_all()
+        if string and sessions.get(phone) != string:
+            sessions[phone] = string
+            self._dirty_sessions.add(phone)
+            self.flush()
+
+    def queue_entities(self, phone, rows):
+        """
+        Queue entity-cache rows for the next batched write.
+        :param phone: Account phone number.
+        :param rows: Iterable of (id, hash, username, phone, name) tuples.
+        """
+        self._entities.setdefault(phone, set()).update(rows)
+        self._pending_entities.setdefault(phone, set()).update(rows)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all queued session and entity changes in one batch.
+        """
+        self._last_flush = time.monotonic()
+        if not self._dirty_sessions and not self._pending_entities:
+            return
+
+        sessions = {phone: self._sessions[phone] for phone in self._dirty_sessions}
+        try:
+            self._write(sessions, self._pending_entities)
+            self._dirty_sessions = set()
+            self._pending_entities = {}
+        except Exception as e:
+            print(f"Failed to write session store: {e}")
+
+    def _read_all(self):
+        raise NotImplementedError
+
+    def _write(self, sessions, entities):
+        raise NotImplementedError
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    All accounts in one SQLite database instead of one file (and journal) per account.
+    """
+
+    def __init__(self, path="sessions.db", flush_interval=FLUSH_INTERVAL):
+        super().__init__(flush_interval)
+        self.path = writable_path(path)
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (phone TEXT PRIMARY KEY, session TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                "account TEXT, id INTEGER, hash INTEGER, username TEXT, phone TEXT, name TEXT, "
+                "PRIMARY KEY (account, id))"
+            )
+        return self._conn
+
+    def _read_all(self):
+        conn = self._connect()
+        sessions = dict(conn.execute("SELECT phone, session FROM sessions"))
+        entities = {}
+        for account, *row in conn.execute("SELECT account, id, hash, username, phone, name FROM entities"):
+            entities.setdefault(account, set()).add(tuple(row))
+        return sessions, entities
+
+    def _write(self, sessions, entities):
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?)", sessions.items())
+            conn.executemany(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?, ?)",
+                [(account, *row) for account, rows in entities.items() for row in rows],
+            )
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Sessions kept in memory, optionally snapshotted to a JSON file on every flush.
+    """
+
+    def __init__(self, snapshot_path=None, flush_interval=FLUSH_INTERVAL):
+        super().__init__(flush_interval)
+        self.snapshot_path = writable_path(snapshot_path) if snapshot_path else None
+
+    def _read_all(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return {}, {}
+        with open(self.snapshot_path, "r") as file:
+            snapshot = json.load(file)
+        entities = {phone: {tuple(row) for row in rows} for phone, rows in snapshot.get("entities", {}).items()}
+        return snapshot.get("sessions", {}), entities
+
+    def _write(self, sessions, entities):
+        if not self.snapshot_path:
+            return
+        snapshot = {
+            "sessions": self._sessions,
+            "entities": {phone: sorted(rows, key=lambda row: row[0]) for phone, rows in self._entities.items()},
+        }
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(snapshot, file)
+        os.replace(temp_path, self.snapshot_path)
+
+
+def migrate_session_files(store, pattern="session_*.session"):
+    """
+    Copy Telethon's per-account session files into the store.
+    :param store: SessionStore to fill.
+    :param pattern: Glob pattern of the legacy session files.
+    :return: Number of migrated accounts.
+    """
+    from telethon.sessions import SQLiteSession, StringSession
+
+    sessions = store.load_all()
+    migrated = 0
+
+    for path in glob.glob(pattern):
+        phone = os.path.basename(path)[len("session_"):-len(".session")]
+        if phone in sessions:
+            continue
+        try:
+            legacy = SQLiteSession(path)
+            string = StringSession.save(legacy)
+            cursor = legacy._cursor()
+            rows = cursor.execute("SELECT id, hash, username, phone, name FROM entities").fetchall()
+            cursor.close()
+            legacy.close()
+        except Exception as e:
+            print(f"Failed to migrate session file {path}: {e}")
+            continue
+
+        if string:
+            store.save_session(phone, string)
+            store.queue_entities(phone, {tuple(row) for row in rows})
+            migrated += 1
+
+    store.flush()
+    return migrated
+
+
+def get_session_store():
+    """
+    Return the process-wide session store configured by SESSION_STORE.
+    :return: SessionStore instance, or None for the legacy per-file backend.
+    """
+    global _store
+    if _store is None and SESSION_STORE != "files":
+        backend, _, path = SESSION_STORE.partition(":")
+        if backend == "sqlite":
+            _store = SqliteSessionStore(path or "sessions.db")
+        elif backend == "memory":
+            _store = MemorySessionStore(path or None)
+        else:
+            raise ValueError(f"Unknown SESSION_STORE backend: {SESSION_STORE}")
+        if not _store.load_all() and glob.glob("session_*.session"):
+            print(f"Migrated {migrate_session_files(_store)} session file(s) into the session store.")
+    return _store
+
+
+def session_for(phone):
+    """
+    Return the session argument for TelegramClient for the given account.
+    :param phone: Account phone number.
+    :return: StoredSession, or the legacy session file name when SESSION_STORE is "files".
+    """
+    store = get_session_store()
+    if store is None:
+        return f"session_{phone}"
+    return store.session(phone)
+
+
+def flush_sessions():
+    """
+    Write any batched session changes, if a shared store is in use.
+    """
+    if _store is not None:
+        _store.flush()
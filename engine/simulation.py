@@ -0,0 +1,328 @@
+import os
+import sys
+import math
+import time
+import asyncio
+import contextlib
+import selectors
+from types import SimpleNamespace
+
+from . import core, modes, prepare, rateControl, sendQueue
+from .core import Scheduler
+from .admission import SpillStore
+from .deadLetters import DeadLetterStore
+from .rateControl import RateController
+from .scheduleTable import parse_send_time
+
+# Modelled Telegram limits, in messages per second, burst size and seconds
+SIM_ACCOUNT_RATE = float(os.environ.get("SIM_ACCOUNT_RATE", "1"))
+SIM_ACCOUNT_BURST = float(os.environ.get("SIM_ACCOUNT_BURST", "20"))
+SIM_CHAT_RATE = float(os.environ.get("SIM_CHAT_RATE", str(20 / 60)))
+SIM_FLOOD_PENALTY = float(os.environ.get("SIM_FLOOD_PENALTY", "5"))
+SIM_LATENCY = float(os.environ.get("SIM_LATENCY", "0.15"))
+SIM_UPLOAD_SECONDS = float(os.environ.get("SIM_UPLOAD_SECONDS", "1"))
+
+# Engine modules whose clock is replaced during a simulation
+CLOCKED_MODULES = (core, modes, sendQueue, rateControl)
+
+
+class TelegramModel:
+    """
+    Modelled Telegram behavior: a token bucket per account, a minimum interval per chat
+    and a FloodWait with a penalty for sends that exceed either.
+    """
+
+    def __init__(self, account_rate=SIM_ACCOUNT_RATE, account_burst=SIM_ACCOUNT_BURST, chat_rate=SIM_CHAT_RATE,
+                 flood_penalty=SIM_FLOOD_PENALTY, latency=SIM_LATENCY, upload_seconds=SIM_UPLOAD_SECONDS):
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.chat_rate = chat_rate
+        self.flood_penalty = flood_penalty
+        self.latency = latency
+        self.upload_seconds = upload_seconds
+        self.flood_waits = {}
+
+
+class SimulatedClient:
+    """
+    Stand-in for a TelegramClient that answers from a TelegramModel on the virtual clock.
+    """
+
+    def __init__(self, phone, model):
+        self.phone = phone
+        self.model = model
+        self._connected = False
+        self._tokens = model.account_burst
+        self._refilled_at = None
+        self._chat_next = {}
+
+    def is_connected(self):
+        return self._connected
+
+    async def connect(self):
+        await asyncio.sleep(self.model.latency)
+        self._connected = True
+
+    async def disconnect(self):
+        self._connected = False
+
+    async def is_user_authorized(self):
+        return True
+
+    async def start(self, phone=None):
+        return self
+
+    async def get_input_entity(self, peer):
+        return peer
+
+    async def get_entity(self, peer):
+        return SimpleNamespace(title=str(peer))
+
+    async def upload_file(self, file, file_name=None):
+        await asyncio.sleep(self.model.upload_seconds)
+        return file_name
+
+    async def __call__(self, request):
+        from telethon import types
+
+        await asyncio.sleep(self.model.latency)
+        return SimpleNamespace(photo=types.Photo(id=0, access_hash=0, file_reference=b"", date=None, sizes=[], dc_id=1))
+
+    async def send_message(self, entity, *args, **kwargs):
+        return await self._send(entity)
+
+    async def send_file(self, entity, *args, **kwargs):
+        return await self._send(entity)
+
+    async def edit_message(self, entity, *args, **kwargs):
+        return await self._send(entity)
+
+    async def _send(self, entity):
+        from telethon import errors
+
+        model = self.model
+        now = asyncio.get_running_loop().time()
+        if self._refilled_at is not None:
+            self._tokens = min(model.account_burst, self._tokens + (now - self._refilled_at) * model.account_rate)
+        self._refilled_at = now
+
+        wait = max((1 - self._tokens) / model.account_rate, self._chat_next.get(entity, 0) - now)
+        if wait > 0:
+            model.flood_waits[self.phone] = model.flood_waits.get(self.phone, 0) + 1
+            raise errors.FloodWaitError(request=None, capture=math.ceil(wait + model.flood_penalty))
+
+        self._tokens -= 1
+        self._chat_next[entity] = now + 1 / model.chat_rate
+        await asyncio.sleep(model.latency)
+        return SimpleNamespace(id=0)
+
+
+class _VirtualSelector:
+    """
+    Selector that jumps the loop's clock to the next timer instead of waiting,
+    while still waiting for real work handed to threads.
+    """
+
+    def __init__(self, selector, loop):
+        self._selector = selector
+        self._loop = loop
+
+    def select(self, timeout=None):
+        if self._loop.busy_threads:
+            # Threads run in real time; the clock stands still until they finish
+            return self._selector.select(0.05 if timeout is None else min(timeout, 0.05))
+        if timeout is None:
+            return self._selector.select(None)
+        events = self._selector.select(0)
+        if not events and timeout > 0:
+            self._loop.now += timeout
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop on a virtual clock: sleeping costs no wall time.
+    The loop counts seconds from the start of the simulation, as timers near epoch
+    values would fall below float resolution.
+    """
+
+    def __init__(self, start=None):
+        super().__init__(selectors.DefaultSelector())
+        self.start = time.time() if start is None else start
+        self.now = 0.0
+        self.busy_threads = 0
+        self._selector = _VirtualSelector(self._selector, self)
+
+    def time(self):
+        return self.now
+
+    def epoch(self):
+        """
+        :return: Virtual wall-clock time as epoch seconds.
+        """
+        return self.start + self.now
+
+    def run_in_executor(self, executor, func, *args):
+        self.busy_threads += 1
+        future = super().run_in_executor(executor, func, *args)
+        future.add_done_callback(lambda _: setattr(self, "busy_threads", self.busy_threads - 1))
+        return future
+
+
+class VirtualTime:
+    """
+    Replacement for the time module inside the engine, reading the virtual loop's clock.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+
+    def time(self):
+        return self._loop.epoch()
+
+    monotonic = time
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+class Recorder:
+    """
+    Status store of a simulation: keeps every outcome in memory instead of writing status.db.
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+        self.events = []
+
+    def record(self, entry, status):
+        if status != "pending":
+            self.events.append((status, entry["phone"], parse_send_time(entry["send_time"]), self._loop.epoch()))
+
+    def flush(self):
+        pass
+
+    def finished_since(self, since):
+        return []
+
+
+def _no_download(media):
+    return b"", os.path.basename(str(media))
+
+
+@contextlib.contextmanager
+def _virtual_clock(loop):
+    clock = VirtualTime(loop)
+    saved = [(module, module.time) for module in CLOCKED_MODULES]
+    saved_fetch = prepare.fetch_media
+    try:
+        for module in CLOCKED_MODULES:
+            module.time = clock
+        prepare.fetch_media = _no_download
+        yield clock
+    finally:
+        for module, original in saved:
+            module.time = original
+        prepare.fetch_media = saved_fetch
+
+
+def simulate(source=None, accounts=None, model=None, interval=modes.POLL_INTERVAL, quiet=True):
+    """
+    Run the real scheduler (run_once) on a virtual clock against modelled accounts.
+    Nothing is sent and no store on disk is written; the schedule and account sources are read as usual.
+    :param source: Schedule source (default is the ScheduleMessage sheet).
+    :param accounts: Account source (default is the TelegramConfig sheet).
+    :param model: TelegramModel (default uses the SIM_* settings).
+    :param interval: Dispatch window of run_once in seconds.
+    :param quiet: Hide the per-message output of the engine.
+    :return: Tuple (recorder events as (status, phone, scheduled, actual) tuples, model, wall seconds).
+    """
+    model = model or TelegramModel()
+    loop = VirtualLoop()
+    started = time.perf_counter()
+
+    with _virtual_clock(loop):
+        scheduler = Scheduler(source, accounts, client_factory=lambda phone, api_id, api_hash: SimulatedClient(phone, model))
+        # Start from the learned rates without writing them back
+        learned = scheduler.rates.limits
+        scheduler.rates = RateController(path=None)
+        scheduler.rates.limits = {key: [rate, 0.0] for key, (rate, _) in learned.items()}
+        scheduler.status = Recorder(loop)
+        scheduler.dead_letters = DeadLetterStore(":memory:")
+        scheduler.native = None
+        scheduler.checkpoint = None
+        if scheduler.spill is not None:
+            scheduler.spill = SpillStore(":memory:")
+
+        output = open(os.devnull, "w") if quiet else sys.stdout
+        try:
+            with contextlib.redirect_stdout(output):
+                loop.run_until_complete(modes.run_once(scheduler, interval))
+        finally:
+            loop.close()
+            if quiet:
+                output.close()
+
+    return scheduler.status.events, model, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    """
+    :param values: Sorted list of numbers.
+    :param fraction: Percentile between 0 and 1.
+    :return: Nearest-rank percentile, or 0 for an empty list.
+    """
+    if not values:
+        return 0
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+def report(events, model, wall_seconds, bucket=60):
+    """
+    Print the projected timeline and lateness distribution of a simulation.
+    :param events: Recorder events returned by simulate.
+    :param model: TelegramModel used.
+    :param wall_seconds: Real time the simulation took.
+    :param bucket: Timeline resolution in seconds.
+    """
+    from datetime import datetime
+
+    sent = [event for event in events if event[0] == "sent"]
+    lateness = sorted(actual - scheduled for _, _, scheduled, actual in sent)
+    statuses = {}
+    for status, *_ in events:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    print(f"Simulated {len(events)} sends in {wall_seconds:.1f}s of wall time: "
+          + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())))
+    if not sent:
+        return
+
+    first = min(actual for *_, actual in sent)
+    last = max(actual for *_, actual in sent)
+    print(f"First send {datetime.fromtimestamp(first):%Y-%m-%d %H:%M:%S}, last send {datetime.fromtimestamp(last):%Y-%m-%d %H:%M:%S}")
+    print("Lateness (s): " + ", ".join(
+        f"p{int(fraction * 100)} {percentile(lateness, fraction):.1f}" for fraction in (0.5, 0.9, 0.99)
+    ) + f", max {lateness[-1]:.1f}")
+
+    print("Accounts:")
+    per_account = {}
+    for _, phone, scheduled, actual in sent:
+        count, latest = per_account.get(phone, (0, 0))
+        per_account[phone] = (count + 1, max(latest, actual))
+    for phone, (count, latest) in sorted(per_account.items(), key=lambda item: str(item[0])):
+        print(f"    {phone}: {count} sent, last at {datetime.fromtimestamp(latest):%H:%M:%S}, "
+              f"{model.flood_waits.get(phone, 0)} flood waits")
+
+    print(f"Timeline (sends per {bucket}s):")
+    timeline = {}
+    for *_, actual in sent:
+        slot = int(actual // bucket * bucket)
+        timeline[slot] = timeline.get(slot, 0) + 1
+    peak = max(timeline.values())
+    for slot in sorted(timeline):
+        bar = "#" * max(1, round(40 * timeline[slot] / peak))
+        print(f"    {datetime.fromtimestamp(slot):%Y-%m-%d %H:%M:%S} {timeline[slot]:6d} {bar}")
@@ -0,0 +1,191 @@
+import io
+import os
+import csv
+import json
+import time
+import asyncio
+
+from sheetNameService import FETCH_TTL, SCRIPT_URL, fetch_shared, stream_json_array
+
+from .tracing import span
+
+
+# File extensions understood by FileSource
+FILE_FORMATS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+# Seconds between two checks of a watched file
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL_SECONDS", "0.5"))
+
+# Bytes kept from the end of the consumed part of a file to recognize appends
+TAIL_BYTES = 256
+
+
+class ListSource:
+    """
+    Rows held in memory, e.g. fixed account credentials.
+    """
+
+    def __init__(self, rows):
+        self._rows = list(rows)
+
+    def rows(self):
+        """
+        :return: Iterator of row dictionaries.
+        """
+        return iter(self._rows)
+
+
+class HttpSource:
+    """
+    Rows from any URL returning a JSON array, parsed while they stream in.
+    With a ttl, reads of the same URL share one request and its materialized result
+    (see sheetNameService.fetch_shared), trading memory for fewer requests.
+    """
+
+    def __init__(self, url, params=None, ttl=FETCH_TTL):
+        """
+        :param url: URL returning a JSON array.
+        :param params: Optional query parameters.
+        :param ttl: Seconds a fetched result is shared (default FETCH_TTL_SECONDS, 0);
+                    0 streams every read on its own.
+        """
+        self.url = url
+        self.params = params
+        self.ttl = ttl
+
+    def rows(self):
+        """
+        :return: Iterator of row dictionaries.
+        :raises: Exception if the request fails or the body is not a JSON array.
+        """
+        if self.ttl > 0:
+            with span("fetch_sheet", url=self.url, params=self.params):
+                return iter(fetch_shared(self.url, self.params, self.ttl))
+        return stream_json_array(self.url, self.params)
+
+
+class SheetSource(HttpSource):
+    """
+    Rows of a Google Sheet served by the Apps Script (see sheetNameService).
+    """
+
+    def __init__(self, sheet_name="ScheduleMessage", ttl=FETCH_TTL):
+        super().__init__(SCRIPT_URL, {"sheetName": sheet_name}, ttl)
+        self.sheet_name = sheet_name
+
+
+class FileSource:
+    """
+    Rows from a local JSON, NDJSON or CSV file such as schedule.json, re-read only when
+    the file changes. For NDJSON and CSV, growth with an unchanged tail is treated as an
+    append and only the new lines are parsed; any other change re-reads the whole file.
+    """
+
+    def __init__(self, path, format=None):
+        """
+        :param path: File path.
+        :param format: "json", "ndjson" or "csv" (default is guessed from the extension).
+        """
+        self.path = path
+        self.format = format or FILE_FORMATS.get(os.path.splitext(path)[1].lower(), "json")
+        self._rows = []
+        self._signature = None
+        self._offset = 0
+        self._tail = b""
+        self._header = None
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def changed(self):
+        """
+        Cheap check (one stat call) whether the file differs from the last read.
+        :return: True if rows() would return something new.
+        """
+        try:
+            return self._stat() != self._signature
+        except FileNotFoundError:
+            return self._signature is not None
+
+    def rows(self):
+        """
+        :return: Iterator of row dictionaries.
+        :raises: Exception if the file cannot be read or parsed; the rows of the last good
+                 read are kept and the same broken file is not parsed again until it changes.
+        """
+        signature = self._stat()
+        if signature != self._signature:
+            state = (self._rows, len(self._rows), self._offset, self._tail, self._header)
+            try:
+                with open(self.path, "rb") as file:
+                    if not self._is_append(file, signature):
+                        self._rows, self._offset, self._tail, self._header = [], 0, b"", None
+                    file.seek(self._offset)
+                    data = file.read()
+                self._parse(data)
+            except Exception:
+                # E.g. an editor halfway through saving: without recording the signature,
+                # changed() would stay true and a watching daemon reload in a tight loop
+                rows, count, self._offset, self._tail, self._header = state
+                del rows[count:]
+                self._rows = rows
+                self._signature = signature
+                raise
+            self._signature = signature
+        return iter(self._rows)
+
+    def _is_append(self, file, signature):
+        if self.format == "json" or self._signature is None:
+            return False
+        inode, size, _ = signature
+        if inode != self._signature[0] or size <= self._offset:
+            return False
+        file.seek(self._offset - len(self._tail))
+        return file.read(len(self._tail)) == self._tail
+
+    def _parse(self, data):
+        if self.format == "json":
+            rows = json.loads(data.decode("utf-8") or "[]")
+            if not isinstance(rows, list):
+                raise ValueError(f"{self.path} does not contain a JSON array")
+            self._rows = rows
+            return
+
+        # Only complete lines are consumed; a partly written last line waits for the next read
+        end = data.rfind(b"\n") + 1
+        text = data[:end].decode("utf-8")
+        self._offset += end
+        self._tail = (self._tail + data[:end])[-TAIL_BYTES:]
+
+        if self.format == "ndjson":
+            self._rows.extend(json.loads(line) for line in text.splitlines() if line.strip())
+        else:
+            reader = csv.DictReader(io.StringIO(text), fieldnames=self._header)
+            self._rows.extend(reader)
+            self._header = reader.fieldnames
+
+    async def wait_for_change(self, timeout, poll=WATCH_INTERVAL):
+        """
+        Poll the file until it changes or the timeout expires.
+        :param timeout: Maximum seconds to wait.
+        :param poll: Seconds between two stat calls.
+        :return: True if the file changed.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.changed():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(poll, remaining))
+
+
+def as_source(source):
+    """
+    Accept either a source object or a plain list of rows.
+    :param source: Object with a rows() method, or an iterable of dictionaries.
+    :return: Source object.
+    """
+    return source if hasattr(source, "rows") else ListSource(source)
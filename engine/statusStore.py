@@ -0,0 +1,164 @@
+import os
+import time
+import sqlite3
+
+from .paths import writable_path
+from .scheduleTable import parse_send_time
+
+# Database the scheduler reports each row's status to, and dashboards read from
+STATUS_DB = os.environ.get("STATUS_DB", "status.db")
+
+# Seconds status changes are batched before they are written
+STATUS_FLUSH_INTERVAL = float(os.environ.get("STATUS_FLUSH_INTERVAL", "2"))
+
+# Most status changes held before they are written, whatever the interval
+STATUS_MAX_BATCH = int(os.environ.get("STATUS_MAX_BATCH", "1000"))
+
+# Days finished rows are kept
+STATUS_RETENTION_DAYS = float(os.environ.get("STATUS_RETENTION_DAYS", "7"))
+
+# Row states; "pending" rows are waiting for their send time or in a send queue
+STATUSES = ("pending", "sent", "failed", "cancelled", "dropped")
+
+
+class StatusStore:
+    """
+    Write side of the status feed: the latest status of every row by row id, batched
+    into SQLite (WAL) so readers in other processes never block the scheduler.
+    """
+
+    def __init__(self, path=STATUS_DB, flush_interval=STATUS_FLUSH_INTERVAL):
+        """
+        :param path: SQLite database path.
+        :param flush_interval: Seconds changes are batched.
+        """
+        self.path = writable_path(path)
+        self.flush_interval = flush_interval
+        self._conn = None
+        self._changes = {}
+        self._flushed_at = time.monotonic()
+        self._pruned_at = 0
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sends ("
+                "row_id TEXT PRIMARY KEY, phone TEXT, group_id TEXT, send_at INTEGER, message TEXT, status TEXT, updated_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sends_status ON sends (status, send_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sends_updated ON sends (status, updated_at)")
+        return self._conn
+
+    def record(self, entry, status):
+        """
+        Queue a status change of one row.
+        :param entry: Schedule row dictionary with a row_id.
+        :param status: One of STATUSES.
+        """
+        self._changes[entry["row_id"]] = (
+            entry["row_id"],
+            entry.get("phone"),
+            str(entry.get("group_id")),
+            parse_send_time(entry["send_time"]),
+            entry.get("message"),
+            status,
+            time.time(),
+        )
+        if len(self._changes) >= STATUS_MAX_BATCH or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the queued changes and, at most hourly, drop rows past retention.
+        """
+        self._flushed_at = time.monotonic()
+        if not self._changes:
+            return
+        changes, self._changes = self._changes, {}
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO sends VALUES (?, ?, ?, ?, ?, ?, ?)", changes.values())
+                if time.time() - self._pruned_at > 3600:
+                    self._pruned_at = time.time()
+                    conn.execute(
+                        "DELETE FROM sends WHERE status != 'pending' AND updated_at < ?",
+                        (time.time() - STATUS_RETENTION_DAYS * 86400,),
+                    )
+        except sqlite3.Error as e:
+            print(f"Failed to write status updates: {e}")
+
+
+    def finished_since(self, since):
+        """
+        Rows that reached a final status, for a new process to skip when it reloads them.
+        :param since: Earliest send time as epoch seconds.
+        :return: List of (row_id, send_at) tuples.
+        """
+        self.flush()
+        try:
+            return self._connect().execute(
+                "SELECT row_id, send_at FROM sends WHERE status != 'pending' AND send_at >= ?", (since,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Failed to read status feed: {e}")
+            return []
+
+
+def open_status(path=STATUS_DB):
+    """
+    Open the status database read-only, for dashboards.
+    :param path: SQLite database path.
+    :return: sqlite3 Connection, or None if the scheduler has not written one yet.
+    """
+    path = writable_path(path)
+    if not os.path.exists(path):
+        return None
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+
+def page(conn, status, limit=50, offset=0, newest_first=False):
+    """
+    One page of rows with a given status, ordered by send time.
+    :param conn: Connection returned by open_status.
+    :param status: One of STATUSES.
+    :param limit: Page size.
+    :param offset: Number of rows to skip.
+    :param newest_first: Order by descending send time.
+    :return: List of (send_at, phone, group_id, message, updated_at) tuples.
+    """
+    order = "DESC" if newest_first else "ASC"
+    return conn.execute(
+        f"SELECT send_at, phone, group_id, message, updated_at FROM sends WHERE status = ? ORDER BY send_at {order} LIMIT ? OFFSET ?",
+        (status, limit, offset),
+    ).fetchall()
+
+
+def counts(conn):
+    """
+    :param conn: Connection returned by open_status.
+    :return: Dictionary with the number of rows per status.
+    """
+    return dict(conn.execute("SELECT status, COUNT(*) FROM sends GROUP BY status"))
+
+
+def account_stats(conn, window=300):
+    """
+    Per-account throughput and queue depth, using the status indexes only.
+    :param conn: Connection returned by open_status.
+    :param window: Seconds the throughput is measured over.
+    :return: List of (phone, messages sent per minute, due rows waiting, upcoming rows) tuples.
+    """
+    now = time.time()
+    stats = {}
+    for phone, sent in conn.execute(
+        "SELECT phone, COUNT(*) FROM sends WHERE status = 'sent' AND updated_at >= ? GROUP BY phone", (now - window,)
+    ):
+        stats[phone] = [sent * 60.0 / window, 0, 0]
+    for phone, due, upcoming in conn.execute(
+        "SELECT phone, SUM(send_at <= ?), SUM(send_at > ?) FROM sends WHERE status = 'pending' GROUP BY phone", (now, now)
+    ):
+        stats.setdefault(phone, [0.0, 0, 0])[1:] = [due, upcoming]
+    return [(phone, *values) for phone, values in sorted(stats.items(), key=lambda item: str(item[0]))]
@@ -0,0 +1,108 @@
+import re
+from functools import lru_cache
+
+# {{name}} placeholders; single braces are left alone so existing messages are sent unchanged
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Sheet columns that are not template variables
+RESERVED_COLUMNS = {"id", "phone", "group_id", "send_time", "message", "media", "status", "priority", "deadline", "api_id", "api_hash"}
+
+
+def split_targets(group_id):
+    """
+    Expand the group_id cell of a broadcast row into its targets.
+    :param group_id: One group ID or username, a list of them, or a comma or newline separated string.
+    :return: List of targets; numeric IDs become ints.
+    """
+    if isinstance(group_id, (list, tuple)):
+        targets = group_id
+    elif isinstance(group_id, str) and ("," in group_id or "\n" in group_id):
+        targets = re.split(r"[,\n]", group_id)
+    else:
+        return [group_id]
+
+    result = []
+    for target in targets:
+        if isinstance(target, str):
+            target = target.strip()
+            if not target:
+                continue
+            if target.lstrip("-").isdigit():
+                target = int(target)
+        result.append(target)
+    return result
+
+
+def row_variables(entry):
+    """
+    Collect the extra columns of a sheet row that can be used as template variables.
+    :param entry: Schedule dictionary.
+    :return: Sorted tuple of (name, value) pairs, hashable so tables can share it between rows.
+    """
+    return tuple(sorted(
+        (name, value)
+        for name, value in entry.items()
+        if name not in RESERVED_COLUMNS and isinstance(value, (str, int, float)) and not isinstance(value, bool)
+    ))
+
+
+@lru_cache(maxsize=4096)
+def compile_template(message):
+    """
+    Split a message into literal text and placeholders once per distinct message.
+    :param message: Message text.
+    :return: Tuple with literal text at even and variable names at odd positions,
+             or None if the message has no placeholders.
+    """
+    parts = PLACEHOLDER.split(message)
+    return tuple(parts) if len(parts) > 1 else None
+
+
+def render(message, variables):
+    """
+    Substitute the placeholders of a message.
+    :param message: Message text.
+    :param variables: Dictionary of variable values.
+    :return: Rendered text.
+    :raises: ValueError if the message uses an unknown variable.
+    """
+    parts = compile_template(message)
+    if parts is None:
+        return message
+
+    rendered = list(parts)
+    for index in range(1, len(rendered), 2):
+        try:
+            rendered[index] = str(variables[rendered[index]])
+        except KeyError:
+            raise ValueError(f"unknown template variable {{{{{rendered[index]}}}}}")
+    return "".join(rendered)
+
+
+async def render_entry(client, entry):
+    """
+    Render the message of a schedule entry for its target.
+    Available variables: group (chat title), group_id, phone, date, time, counter
+    (position of the target within its broadcast row) and every extra sheet column.
+    :param client: Connected TelegramClient instance, used only when {{group}} appears.
+    :param entry: Schedule row dictionary.
+    :return: Rendered text.
+    :raises: ValueError if the message uses an unknown variable.
+    """
+    message = entry.get("message")
+    parts = compile_template(message)
+    if parts is None:
+        return message
+
+    variables = dict(entry.get("vars") or ())
+    variables.update(
+        group_id=entry.get("group_id"),
+        phone=entry.get("phone"),
+        date=entry.get("send_time", "")[:10],
+        time=entry.get("send_time", "")[11:16],
+        counter=entry.get("counter", 1),
+    )
+    if "group" in parts[1::2]:
+        entity = await client.get_entity(entry.get("group_id"))
+        variables["group"] = getattr(entity, "title", None) or getattr(entity, "first_name", None) or entry.get("group_id")
+    return render(message, variables)
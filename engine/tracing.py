@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import contextlib
+from collections import Counter
+
+# Chrome trace file written when tracing is on; setting it turns tracing on at start-up
+TRACE_FILE = os.environ.get("TRACE_FILE", "")
+
+# Seconds between two samples of the sampling profiler
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.01"))
+
+_NO_SPAN = contextlib.nullcontext()
+
+# Open trace file, or None while tracing is off
+_trace = None
+_trace_lock = threading.Lock()
+
+
+def enable_tracing(path=None):
+    """
+    Start appending spans to a Chrome trace file (JSON array format, which
+    chrome://tracing and Perfetto read even while the closing bracket is missing).
+    :param path: Trace file (default is TRACE_FILE, or trace.json).
+    :return: Path of the trace file.
+    """
+    global _trace
+    from .paths import writable_path
+
+    path = writable_path(path or TRACE_FILE or "trace.json")
+    with _trace_lock:
+        if _trace is None:
+            new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+            _trace = open(path, "a", encoding="utf-8")
+            if new_file:
+                _trace.write("[\n")
+    return path
+
+
+def disable_tracing():
+    """
+    Stop tracing and close the trace file.
+    """
+    global _trace
+    with _trace_lock:
+        if _trace is not None:
+            _trace.close()
+            _trace = None
+
+
+def tracing_enabled():
+    return _trace is not None
+
+
+def _lane():
+    # One lane per asyncio task so concurrent sends do not overlap in the viewer
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+@contextlib.contextmanager
+def _span(name, args):
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": round(started_at * 1e6),
+            "dur": round((time.perf_counter() - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": _lane(),
+            "args": args,
+        }
+        line = json.dumps(event, default=str) + ",\n"
+        with _trace_lock:
+            if _trace is not None:
+                _trace.write(line)
+                _trace.flush()
+
+
+def span(name, **args):
+    """
+    Time a block of code as one span of the trace; costs nothing while tracing is off.
+    :param name: Stage name, e.g. "upload" or "send_rpc".
+    :param args: Details shown with the span, e.g. the target chat.
+    :return: Context manager.
+    """
+    if _trace is None:
+        return _NO_SPAN
+    return _span(name, args)
+
+
+class Sampler:
+    """
+    Sampling profiler: a thread records the stacks of every other thread at a fixed
+    interval, so it can be switched on in a running process without a restart.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        # Guards stacks: folded() runs in request threads while the sampler thread counts
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Start sampling with fresh counts; does nothing if already running.
+        """
+        if self.running:
+            return
+        with self._lock:
+            self.stacks.clear()
+        self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling; the counts stay available.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            sample = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                sample.append(";".join(reversed(stack)))
+            with self._lock:
+                self.stacks.update(sample)
+            self.samples += 1
+
+    def folded(self, top=None):
+        """
+        The samples in folded-stack format (one "frame;frame;frame count" line per stack),
+        readable by flamegraph.pl, speedscope and similar tools.
+        :param top: Optional number of most frequent stacks to keep.
+        :return: Text.
+        """
+        with self._lock:
+            stacks = Counter(self.stacks)
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common(top))
+
+
+# Process-wide profiler, toggled from the Flask app
+sampler = Sampler()
+
+if TRACE_FILE:
+    enable_tracing(TRACE_FILE)
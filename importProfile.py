@@ -0,0 +1,109 @@
+import os
+import re
+import subprocess
+import sys
+
+# Modules whose import cost is tracked: the entry points, and the engine modules they
+# load on first use (the dashboard and serverless paths import them for every request).
+# Each maps to the third-party modules it cannot defer; their own import cost, measured
+# in the same run, is added to its budget
+ENTRY_POINTS = {
+    "main": ("flask",),  # The WSGI app object is created at import time
+    "schedule": (),
+    "scheduleAll": (),
+    "scheduleByAccount": (),
+    "scheduleByPhone": (),
+    "sch": (),
+    "sheetNameService": (),
+    "api.index": (),
+    "engine": (),
+    "engine.statusStore": (),
+}
+
+# Process start budget in milliseconds, on top of the modules listed in ENTRY_POINTS
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "250"))
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_import(module, root=None):
+    """
+    Import a module in a fresh interpreter with ``-X importtime`` and parse the report.
+    :param module: Dotted module name to import.
+    :param root: Directory to run from (default is this file's directory).
+    :return: Tuple (total_ms, rows) where rows are (cumulative_ms, self_ms, depth, name).
+    :raises: Exception if the import fails.
+    """
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"Importing '{module}' failed: {result.stderr.strip().splitlines()[-1]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, (len(indent) - 1) // 2, name))
+
+    # Top-level imports (depth 0) add up to the whole import cost
+    total_ms = sum(row[0] for row in rows if row[2] == 0)
+    return total_ms, rows
+
+
+def dependency_cost(module, costs):
+    """
+    :param module: Dotted name of a third-party module.
+    :param costs: Dictionary caching the results by module name.
+    :return: Import time of the module alone in milliseconds.
+    :raises: Exception if the import fails.
+    """
+    if module not in costs:
+        _, rows = profile_import(module)
+        costs[module] = next(row[0] for row in rows if row[3] == module and row[2] == 0)
+    return costs[module]
+
+
+def report(modules=None, budget_ms=STARTUP_BUDGET_MS, top=5):
+    """
+    Print the import-time report for each entry point and check it against its budget.
+    :param modules: Entry points to profile (default is ENTRY_POINTS).
+    :param budget_ms: Allowed import time per entry point in milliseconds, on top of its dependencies.
+    :param top: Number of modules with the highest self time to list.
+    :return: List of entry points that exceeded the budget or failed to import.
+    """
+    over_budget = []
+    costs = {}
+
+    for module in modules or ENTRY_POINTS:
+        try:
+            total_ms, rows = profile_import(module)
+            dependencies = {name: dependency_cost(name, costs) for name in ENTRY_POINTS.get(module, ())}
+        except Exception as e:
+            print(f"{module}: {e}")
+            over_budget.append(module)
+            continue
+
+        budget = budget_ms + sum(dependencies.values())
+        allowance = "".join(f" + {cost:.0f} ms {name}" for name, cost in dependencies.items())
+        status = "OK" if total_ms <= budget else "OVER BUDGET"
+        print(f"{module}: {total_ms:.1f} ms (budget {budget_ms:.0f} ms{allowance}) {status}")
+
+        heaviest = sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+        for cumulative_ms, self_ms, _, name in heaviest:
+            print(f"    {self_ms:8.1f} ms self {cumulative_ms:8.1f} ms total  {name}")
+
+        if total_ms > budget:
+            over_budget.append(module)
+
+    return over_budget
+
+
+if __name__ == "__main__":
+    failed = report(sys.argv[1:] or None)
+    sys.exit(1 if failed else 0)
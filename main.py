@@ -1,165 +1,92 @@
-import json
-import asyncio
-import time
-from datetime import datetime
-from telethon import TelegramClient
-import requests
-from flask import Flask, jsonify
+import os
+from flask import Flask, Response, abort, jsonify, request
 
-# Google Apps Script URL for fetching data
-SCRIPT_URL = "https://script.google.com/macros/s/AKfycbxbjL5HKI-EleVzQZ4s9nQCnvXsrwh5FHciXjlRshue8wOhrN7lUvJgVAH7wNrXEWi4PQ/exec"
+from shutdownSignals import stop_on_signals
 
 app = Flask(__name__)
 
-# Store clients globally
-clients = {}
+# Token required by the /debug routes; they do not exist while it is unset
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
 
-async def initialize_clients():
-    """
-    Initialize Telegram clients from configuration data.
-    :return: Dictionary with phone numbers as keys and Telegram clients as values.
-    """
-    global clients
-    config_data = fetch_sheet_data("TelegramConfig")
-
-    for config in config_data:
-        api_id = config.get("api_id")
-        api_hash = config.get("api_hash")
-        phone = config.get("phone")
-
-        if api_id and api_hash and phone:
-            try:
-                client = TelegramClient(f"session_{phone}", api_id, api_hash)
-                clients[phone] = client
-                print(f"Initialized client for {phone}.")
-            except Exception as e:
-                print(f"Failed to initialize client for {phone}: {e}")
-        else:
-            print(f"Invalid configuration: {config}")
-
-
-def fetch_sheet_data(sheet_name="ScheduleMessage"):
-    """
-    Fetch data from a specific Google Sheet via Google Apps Script.
-    :param sheet_name: Name of the sheet.
-    :return: Parsed JSON data.
-    """
-    try:
-        response = requests.get(SCRIPT_URL, params={"sheetName": sheet_name})
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error fetching data from '{sheet_name}': {e}")
-        return []
+# Background scheduler thread, started by the first request
+scheduler_thread = None
+
+# Scheduler reused by warm serverless invocations
+scheduler = None
 
 
-async def send_message(client, group_id, message, media=None):
+@app.route("/", methods=["GET"])
+def index():
     """
-    Send a message or media to a Telegram group.
-    :param client: Initialized TelegramClient instance.
-    :param group_id: Group ID or username.
-    :param message: Text message.
-    :param media: Optional media file.
+    Flask route to trigger the message scheduler.
+    On Vercel each request sends the messages due in the current window;
+    elsewhere it starts the continuous scheduler in the background once.
     """
+    global scheduler, scheduler_thread
+    from engine import Scheduler, run_serverless, start_background
+
     try:
-        await client.start()
-        entity = await client.get_entity(group_id)
-        if media:
-            await client.send_file(entity, media, caption=message)
-        else:
-            await client.send_message(entity, message)
-        print(f"Message sent to {group_id}: {message}")
+        if os.environ.get("VERCEL"):
+            scheduler = scheduler or Scheduler()
+            sent = run_serverless(scheduler)
+            return jsonify({"status": "Success", "message": f"Sent {sent} scheduled message(s)."})
+
+        if scheduler_thread is None or not scheduler_thread.is_alive():
+            scheduler_thread = start_background(Scheduler())
+        return jsonify({"status": "Success", "message": "Scheduler triggered successfully."})
     except Exception as e:
-        print(f"Failed to send message to {group_id}: {e}")
+        return jsonify({"status": "Error", "message": str(e)})
 
 
-async def schedule_message(client, send_time, group_id, message, media=None):
+def check_debug_token():
     """
-    Schedule a message to be sent at a specific time.
-    :param client: Initialized TelegramClient instance.
-    :param send_time: Scheduled time (format: '%Y-%m-%d %H:%M:%S').
-    :param group_id: Group ID or username.
-    :param message: Text message.
-    :param media: Optional media file.
+    Hide the debug routes unless the request carries DEBUG_TOKEN (?token= or X-Debug-Token).
     """
-    try:
-        now = datetime.now()
-        formatted_now = now.strftime("%Y-%m-%d %H:%M")
-        send_time_obj = datetime.strptime(send_time, "%Y-%m-%d %H:%M")
-        # delay = (send_time_obj - now).total_seconds()
-
-        # if delay > 0:
-        #     print(f"Waiting {delay:.2f} seconds to send the message at {send_time}...")
-        #     await asyncio.sleep(delay)
-        # print(f"formatted_now == send_time", formatted_now , send_time)
-        if formatted_now == send_time:
-            await send_message(client, group_id, message, media)
-    except ValueError:
-        print(f"Invalid send_time format: {send_time}. Use '%Y-%m-%d %H:%M:%S'.")
-    except Exception as e:
-        print(f"Error scheduling message for {group_id}: {e}")
+    token = request.args.get("token") or request.headers.get("X-Debug-Token")
+    if not DEBUG_TOKEN or token != DEBUG_TOKEN:
+        abort(404)
 
 
-async def process_schedules(sheet_name="ScheduleMessage"):
+@app.route("/debug/trace", methods=["GET", "POST"])
+def trace():
     """
-    Process schedules for specific accounts and send messages.
-    :param sheet_name: Sheet name to fetch schedule data.
+    Turn per-send trace spans on (?enable=1) or off (?enable=0), or report their state.
+    The file opens in chrome://tracing or ui.perfetto.dev.
     """
-    schedules = fetch_sheet_data(sheet_name)
-
-    if not schedules:
-        print("No schedules found.")
-        return
+    from engine import tracing
 
-    tasks = []
+    check_debug_token()
+    enable = request.args.get("enable")
+    path = None
+    if enable == "1":
+        path = tracing.enable_tracing(request.args.get("file"))
+    elif enable == "0":
+        tracing.disable_tracing()
+    return jsonify({"tracing": tracing.tracing_enabled(), "file": path})
 
-    for entry in schedules:
-        phone = entry.get("phone")  # Identify the account to use
-        send_time = entry.get("send_time")
-        group_id = entry.get("group_id")
-        message = entry.get("message")
-        media = entry.get("media")
 
-        if phone and phone in clients and send_time and group_id and message:
-            client = clients[phone]
-            tasks.append(schedule_message(client, send_time, group_id, message, media))
-        else:
-            print(f"Skipping invalid or unassigned schedule entry: {entry}")
-
-    if tasks:
-        await asyncio.gather(*tasks)
-    else:
-        print("No valid schedules to process.")
-
-
-async def check_and_process_schedules():
+@app.route("/debug/profile", methods=["GET", "POST"])
+def profile():
     """
-    Continuously check for new schedules and process them.
+    Start (?action=start) or stop (?action=stop) the sampling profiler; without an action,
+    return the samples so far as folded stacks for flamegraph.pl or speedscope.
     """
-    while True:
-        await process_schedules()
-        print("Waiting for the next check...")
-        await asyncio.sleep(60)  # Check every 60 seconds
+    from engine.tracing import sampler
 
+    check_debug_token()
+    action = request.args.get("action")
+    if action == "start":
+        sampler.start()
+    elif action == "stop":
+        sampler.stop()
+    if action:
+        return jsonify({"running": sampler.running, "samples": sampler.samples})
+    top = request.args.get("top", type=int)
+    return Response(sampler.folded(top), mimetype="text/plain")
 
-@app.route("/", methods=["GET"])
-def index():
-    """
-    Flask route to trigger the message scheduler.
-    """
-    try:
-        asyncio.run(main())  # Run the main async function
-        return jsonify({"status": "Success", "message": "Scheduler triggered successfully."})
-    except Exception as e:
-        return jsonify({"status": "Error", "message": str(e)})
 
-
-async def main():
-    """
-    Main function to initialize clients and start the continuous scheduling check.
-    """
-    await initialize_clients()
-    await check_and_process_schedules()
+# Drain the scheduler and disconnect its clients before the server exits on SIGTERM
+stop_on_signals()
 
 
 if __name__ == "__main__":
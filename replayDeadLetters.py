@@ -0,0 +1,35 @@
+import sys
+import asyncio
+
+
+async def main(args):
+    """
+    List or replay the sends that failed for good.
+    Usage: python replayDeadLetters.py [--list] [--reason TEXT] [row_id ...]
+    Without --list, every matching dead letter is sent again right away.
+    """
+    from engine import Scheduler
+    from engine.deadLetters import replay
+
+    reason = None
+    if "--reason" in args:
+        index = args.index("--reason")
+        reason = args[index + 1]
+        args = args[:index] + args[index + 2:]
+    listing = "--list" in args
+    row_ids = [arg for arg in args if arg != "--list"]
+
+    scheduler = Scheduler(interactive=True)
+    if listing:
+        for letter in scheduler.dead_letters.select(row_ids, reason):
+            print(f"{letter['row_id']}: {letter['reason']} ({letter['attempts']} attempts)")
+        return
+
+    sent = await replay(scheduler, row_ids, reason)
+    await scheduler.close()
+    print(f"Replayed dead letters, {sent} sent.")
+
+
+# Run the replay
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
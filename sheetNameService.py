@@ -1,9 +1,20 @@
-import requests
+import os
 import json
+import time
+import codecs
+import threading
 
 # Define the Google Apps Script URL
 SCRIPT_URL = "https://script.google.com/macros/s/AKfycbxbjL5HKI-EleVzQZ4s9nQCnvXsrwh5FHciXjlRshue8wOhrN7lUvJgVAH7wNrXEWi4PQ/exec"
 
+# Seconds a fetched sheet is shared with later callers before it is fetched again;
+# 0 (the default) streams every read, so memory does not grow with the sheet
+FETCH_TTL = float(os.environ.get("FETCH_TTL_SECONDS", "0"))
+
+# In-flight and recently finished fetches, keyed by URL and query parameters
+_flights = {}
+_flights_lock = threading.Lock()
+
 def fetch_sheet_name(sheet_name="ScheduleMessage"):
     """
     Fetch data from a specific sheet in Google Sheets.
@@ -12,6 +23,8 @@ def fetch_sheet_name(sheet_name="ScheduleMessage"):
     :return: Parsed JSON data from the Google Apps Script.
     :raises: Exception if the request fails.
     """
+    import requests
+
     try:
         # Add the sheet name as a query parameter
         params = {"sheetName": sheet_name}
@@ -35,6 +48,8 @@ def create_data_by_sheet_name(config=None, data=None):
     :return: The response object from the request.
     :raises: Exception if the request fails.
     """
+    import requests
+
     if config is None:
         config = {"isContact": True}
     if data is None:
@@ -54,3 +69,132 @@ def create_data_by_sheet_name(config=None, data=None):
     except requests.RequestException as e:
         print(f"Error sending data: {e}")
         raise
+
+
+def iter_json_array(chunks):
+    """
+    Incrementally parse a JSON array from text chunks, yielding each element as soon as it is complete.
+
+    :param chunks: Iterable of decoded text chunks.
+    :return: Generator of array elements.
+    :raises: ValueError if the text is not a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        length = len(buffer)
+
+        while True:
+            while pos < length and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= length:
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"Expected a JSON array, got: {buffer[pos:pos + 80]}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Element not complete yet
+            if buffer[pos] not in "{[\"":
+                # A number may continue in the next chunk ("2." of "2.5"), so a scalar only
+                # counts once a delimiter follows it
+                tail = end
+                while tail < length and buffer[tail] in "0123456789.eE+-":
+                    tail += 1
+                if tail >= length:
+                    break
+                if buffer[end] not in " \t\r\n,]":
+                    raise ValueError(f"Invalid JSON array element: {buffer[pos:pos + 80]}")
+            yield element
+            pos = end
+
+        buffer = buffer[pos:]
+
+    raise ValueError("Truncated JSON array")
+
+
+def stream_json_array(url, params=None, chunk_size=64 * 1024):
+    """
+    GET a JSON array and yield its elements one by one while the response is still downloading,
+    so memory does not grow with the size of the response.
+
+    :param url: URL returning a JSON array.
+    :param params: Optional query parameters.
+    :param chunk_size: Number of bytes read from the response at a time.
+    :return: Generator of array elements.
+    :raises: Exception if the request fails or the body is not a JSON array.
+    """
+    import requests
+
+    with requests.get(url, params=params, stream=True) as response:
+        response.raise_for_status()
+
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        chunks = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size))
+        yield from iter_json_array(chunks)
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "finished_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+def fetch_shared(url, params=None, ttl=FETCH_TTL):
+    """
+    Fetch a JSON array once for all concurrent callers (single flight).
+    Callers asking for the same URL and parameters while a fetch is running wait for it
+    and share its result, which is also reused for ttl seconds after it finished.
+    Failures are shared with the waiting callers but not memoized.
+
+    :param url: URL returning a JSON array.
+    :param params: Optional query parameters.
+    :param ttl: Seconds a finished fetch is reused (0 disables the memo).
+    :return: List of array elements, shared between callers; do not modify it.
+    :raises: Exception if the request fails or the body is not a JSON array.
+    """
+    key = (url, tuple(sorted((params or {}).items())))
+
+    with _flights_lock:
+        # Expired results are released, not kept until the next fetch of the same key
+        now = time.monotonic()
+        for stale in [k for k, f in _flights.items() if f.done.is_set() and now - f.finished_at >= ttl]:
+            del _flights[stale]
+        flight = _flights.get(key)
+        leader = flight is None or (flight.done.is_set() and time.monotonic() - flight.finished_at >= ttl)
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if leader:
+        try:
+            flight.result = list(stream_json_array(url, params))
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.finished_at = time.monotonic()
+            flight.done.set()
+            # Failures and results without a memo only go to the callers already waiting
+            if flight.error is not None or ttl <= 0:
+                with _flights_lock:
+                    if _flights.get(key) is flight:
+                        del _flights[key]
+    else:
+        flight.done.wait()
+
+    if flight.error is not None:
+        raise flight.error
+    return flight.result
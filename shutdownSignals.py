@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import signal
+import functools
+import threading
+
+# Signals that start a graceful shutdown of the running schedulers
+SHUTDOWN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+# Seconds waited for a shutdown beyond its grace period (disconnecting, flushing)
+SHUTDOWN_SLACK = 10
+
+# Signals whose next delivery goes straight to the previous handler
+_passing = set()
+
+
+def _running_loop():
+    # Without asyncio imported no event loop can be running; importing it here would cost startup time
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return None
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def running_schedulers():
+    """
+    :return: List of the schedulers with a run in progress; empty while the engine is not imported.
+    """
+    core = sys.modules.get("engine.core")
+    return list(core.Scheduler.running) if core is not None else []
+
+
+def _timeout():
+    core = sys.modules.get("engine.core")
+    return (core.SHUTDOWN_GRACE if core is not None else 0) + SHUTDOWN_SLACK
+
+
+def stop_all(wait=True):
+    """
+    Shut down every scheduler running in this process (see Scheduler.shutdown).
+    :param wait: Block until their shutdown is done; only from outside their event loops.
+    :return: List of the stopped schedulers.
+    """
+    schedulers = running_schedulers()
+    for scheduler in schedulers:
+        scheduler.stop()
+    if wait:
+        for scheduler in schedulers:
+            if scheduler.loop is not None and scheduler.loop.is_running():
+                scheduler.finished.wait(_timeout())
+    return schedulers
+
+
+def _pass_on(previous, signum, frame=None):
+    if callable(previous):
+        previous(signum, frame)
+    elif previous == signal.SIG_DFL:
+        signal.signal(signum, signal.SIG_DFL)
+        signal.raise_signal(signum)
+
+
+def _resend_after_shutdown(schedulers, signum):
+    deadline = time.monotonic() + _timeout()
+    for scheduler in schedulers:
+        scheduler.finished.wait(max(0, deadline - time.monotonic()))
+    # Handlers run in the main thread only: deliver the signal again for _on_signal to pass on
+    os.kill(os.getpid(), signum)
+
+
+def _on_signal(previous, signum, frame):
+    loop = _running_loop()
+    if signum in _passing:
+        _passing.discard(signum)
+        _pass_on(previous, signum, frame)
+    elif loop is None:
+        # The schedulers run in other threads: wait for them, then let the host handle the signal
+        stop_all()
+        _pass_on(previous, signum, frame)
+    else:
+        # The signal interrupted a scheduler's own loop (e.g. a serverless invocation), which
+        # must keep running to shut down: pass the signal on once the shutdown is done, even
+        # if the loop has returned by then
+        schedulers = stop_all(wait=False)
+        _passing.add(signum)
+        threading.Thread(
+            target=_resend_after_shutdown, args=(schedulers, signum), name="shutdown-signal", daemon=True
+        ).start()
+
+
+def stop_on_signals():
+    """
+    Shut the running schedulers down gracefully on SIGTERM and SIGINT instead of dying
+    mid-send, then pass the signal on to the previous handler. Inside an event loop that
+    runs until its scheduler returns (run_daemon, run_once) the handler only stops it and
+    the run returns after the shutdown.
+    Cheap to install at import time: the engine is only looked at when a signal arrives.
+    Python only allows signal handlers in the main thread; elsewhere this does nothing.
+    :return: True if the handlers were installed.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    loop = _running_loop()
+
+    for signum in SHUTDOWN_SIGNALS:
+        if loop is not None:
+            try:
+                loop.add_signal_handler(signum, stop_all, False)
+                continue
+            except NotImplementedError:
+                pass  # Event loops on Windows
+        signal.signal(signum, functools.partial(_on_signal, signal.getsignal(signum)))
+    return True
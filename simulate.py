@@ -0,0 +1,21 @@
+import sys
+
+
+def main(args):
+    """
+    Project when the current schedule would go out, without sending anything.
+    Usage: python simulate.py [schedule file]
+    The schedule comes from the ScheduleMessage sheet, or from a JSON, NDJSON or CSV file;
+    accounts always come from the TelegramConfig sheet. Telegram's limits are modelled
+    with the SIM_* environment variables (see engine/simulation.py).
+    """
+    from engine.simulation import report, simulate
+    from engine.sources import FileSource
+
+    source = FileSource(args[0]) if args else None
+    events, model, wall_seconds = simulate(source)
+    report(events, model, wall_seconds)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])